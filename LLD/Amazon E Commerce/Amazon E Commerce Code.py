@@ -1,8 +1,144 @@
+import asyncio
+import atexit
+import bisect
+import contextlib
+import heapq
+import itertools
+import json
+import math
+import mmap
+import os
 import random
+import struct
+import sys
+import threading
+import time
+import weakref
+import zlib
+from array import array
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from collections import defaultdict, deque
 
 
+# Structured, level-gated event logger. A call records the event name, a message template and
+# its fields; formatting (the template, or a JSON line when structured) happens on a background
+# writer thread that drains records in batches. The level methods of disabled levels are bound
+# to a no-op, so a disabled call costs one function call and never formats anything. With
+# stream=None records go to whatever sys.stdout is when they are logged. configure only
+# changes the settings it is given; UNCHANGED stands in for a stream that was not passed,
+# since None is itself a valid stream.
+class EventLogger:
+    DEBUG, INFO, WARNING, ERROR, OFF = 10, 20, 30, 40, 100
+    LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+    UNCHANGED = object()
+
+    def __init__(self, level: int = INFO, stream=None, structured: bool = False, background: bool = True,
+                 batch_size: int = 512, poll_interval: float = 0.005):
+        self.stream = stream
+        self.structured = structured
+        self.background = background
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.records = deque()
+        self.wakeup = threading.Event()
+        self.idle = threading.Condition()
+        self.writing = False
+        self.worker = None
+        self.set_level(level)
+
+    def configure(self, level: int = None, stream=UNCHANGED, structured: bool = None, background: bool = None):
+        self.flush()
+        if stream is not EventLogger.UNCHANGED:
+            self.stream = stream
+        if structured is not None:
+            self.structured = structured
+        if background is not None:
+            self.background = background
+        self.set_level(self.level if level is None else level)
+
+    def set_level(self, level: int):
+        self.level = level
+        for name, value in (("debug", self.DEBUG), ("info", self.INFO), ("warning", self.WARNING), ("error", self.ERROR)):
+            setattr(self, name, self._method(value) if value >= level else self._discard)
+
+    def enabled_for(self, level: int) -> bool:
+        return level >= self.level
+
+    # Logging below level inside the block, e.g. to silence hot paths in benchmarks
+    @contextlib.contextmanager
+    def disabled(self, level: int = OFF):
+        previous = self.level
+        self.set_level(level)
+        try:
+            yield
+        finally:
+            self.set_level(previous)
+
+    # Blocks until every record logged so far has been written
+    def flush(self):
+        if self.worker is None:
+            return
+        with self.idle:
+            while self.records or self.writing:
+                self.wakeup.set()
+                self.idle.wait(self.poll_interval)
+
+    @staticmethod
+    def _discard(event: str, message: str = "", **fields):
+        pass
+
+    def _method(self, level: int):
+        records = self.records
+
+        def log(event: str, message: str = "", **fields):
+            record = (time.time(), level, event, message, fields, self.stream or sys.stdout)
+            if not self.background:
+                self._write([record])
+                return
+            records.append(record)
+            if self.worker is None:
+                self._start()
+        return log
+
+    def _start(self):
+        with self.idle:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name="event-logger", daemon=True)
+                self.worker.start()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            while self.records:
+                with self.idle:
+                    self.writing = True
+                batch = [self.records.popleft() for _ in range(min(self.batch_size, len(self.records)))]
+                try:
+                    self._write(batch)
+                finally:
+                    with self.idle:
+                        self.writing = False
+                        self.idle.notify_all()
+
+    def _write(self, batch: list):
+        lines = defaultdict(list)  # stream -> formatted lines
+        for created_at, level, event, message, fields, stream in batch:
+            text = message.format(**fields) if fields else message
+            if self.structured:
+                text = json.dumps({"ts": round(created_at, 6), "level": self.LEVEL_NAMES[level], "event": event,
+                                   "message": text, **fields}, default=str)
+            lines[stream].append(text)
+        for stream, texts in lines.items():
+            try:
+                stream.write("\n".join(texts) + "\n")
+                stream.flush()
+            except (OSError, ValueError):
+                pass  # The stream was closed or broken since the records were logged
+
+logger = EventLogger()
+atexit.register(logger.flush)
+
 # Observer pattern implementation
 class Observer:
     def update(self, *args, **kwargs):
@@ -22,34 +158,364 @@ class Subject:
         for observer in self.observers:
             observer.update(*args, **kwargs)
 
+# Topic-based delivery of inventory events. Subscribers register for the products they care
+# about (customers for the products in their cart), so an event reaches only that product's
+# subscribers instead of every observer. Subscriptions are weak references: a customer that is
+# no longer referenced anywhere else drops out of its topics by itself. Events are queued by
+# publish and delivered in batches on a background thread; repeated events for a product
+# within a batch are delivered once. With asynchronous=False, publish delivers immediately.
+# Queued events are counted per product, so flush(products) waits only for those products'
+# events rather than the whole backlog. publish counts an event before returning, so an empty
+# outstanding means nothing published so far is still undelivered.
+class InventoryEventBus:
+    def __init__(self, batch_size: int = 1024, asynchronous: bool = True):
+        self.batch_size = batch_size
+        self.asynchronous = asynchronous
+        self.topics = {}  # product name -> WeakSet of subscribers
+        self.pending = deque()
+        self.outstanding = defaultdict(int)  # product name -> events queued or being delivered
+        self.lock = threading.Lock()  # Guards topics
+        self.condition = threading.Condition()  # Signals new events and finished batches
+        self.delivering = False
+        self.closed = False
+        self.worker = None
+        self.delivered = 0
+        self.batches = 0
+
+    def subscribe(self, product: 'Product', subscriber: Observer):
+        with self.lock:
+            subscribers = self.topics.get(product.name)
+            if subscribers is None:
+                subscribers = self.topics[product.name] = weakref.WeakSet()
+            subscribers.add(subscriber)
+
+    def unsubscribe(self, product: 'Product', subscriber: Observer):
+        with self.lock:
+            subscribers = self.topics.get(product.name)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.topics[product.name]
+
+    def subscriber_count(self, product: 'Product') -> int:
+        subscribers = self.topics.get(product.name)
+        return len(subscribers) if subscribers is not None else 0
+
+    # O(1) for the publisher: events for products nobody subscribes to are dropped here
+    def publish(self, product: 'Product', action: str):
+        if product.name not in self.topics:
+            return
+        if not self.asynchronous:
+            self._deliver([(product, action)])
+            return
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("event bus is closed")
+            self.pending.append((product, action))
+            self.outstanding[product.name] += 1
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name="inventory-events", daemon=True)
+                self.worker.start()
+            self.condition.notify_all()
+
+    # Blocks until every event published so far has been delivered, or with products only the
+    # events for those products
+    def flush(self, products: list = None):
+        with self.condition:
+            if products is None:
+                while self.pending or self.delivering:
+                    self.condition.wait()
+            elif self.outstanding:
+                names = [product.name for product in products]
+                while any(name in self.outstanding for name in names):
+                    self.condition.wait()
+
+    def close(self):
+        self.flush()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.worker is not None:
+            self.worker.join()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+                self.delivering = True
+            try:
+                self._deliver(batch)
+            finally:
+                with self.condition:
+                    self.delivering = False
+                    for product, _ in batch:
+                        self.outstanding[product.name] -= 1
+                        if not self.outstanding[product.name]:
+                            del self.outstanding[product.name]
+                    self.condition.notify_all()
+
+    def _deliver(self, batch: list):
+        events = {}  # product name -> (product, actions in publish order)
+        for product, action in batch:
+            actions = events.setdefault(product.name, (product, []))[1]
+            if action not in actions:
+                actions.append(action)
+        for name, (product, actions) in events.items():
+            with self.lock:
+                subscribers = list(self.topics.get(name, ()))
+            for action in actions:
+                for subscriber in subscribers:
+                    subscriber.update(product, action=action)
+                self.delivered += len(subscribers)
+        self.batches += 1
+
 # Product class representing individual products
 class Product:
-    def __init__(self, name: str, price: float, count: int):
+    def __init__(self, name: str, price: float, count: int, sku: str = None, category: str = None):
         self.name = name
         self.price = price
         self.count = count
+        self.sku = sku
+        self.category = category
 
-# Inventory class to manage products
+# Inventory class to manage products. Products are keyed by name (names are unique; adding a
+# name again replaces the product) with secondary indexes on SKU, category and price buckets,
+# so add, remove and lookup are O(1). Change events go to the observers attached to the whole
+# inventory and, through the event bus, to the subscribers of the product that changed.
 class Inventory(Subject):
-    def __init__(self):
+    def __init__(self, price_bucket_width: float = 10.0, events: InventoryEventBus = None):
         super().__init__()
-        self.products = []
+        self.events = events if events is not None else InventoryEventBus()
+        self.products = {}  # name -> Product, in insertion order
+        self.by_sku = {}
+        self.by_category = defaultdict(dict)  # category -> {name: Product}
+        self.price_bucket_width = price_bucket_width
+        self.by_price_bucket = defaultdict(dict)  # floor(price / width) -> {name: Product}
 
     def add_product(self, product: Product):
-        self.products.append(product)
+        if product.name in self.products:
+            self._unindex(self.products[product.name])
+        self.products[product.name] = product
+        self._index(product)
         self.notify(product, action="add")
-        print(f"Product '{product.name}' added to inventory.")
+        logger.info("inventory.product_added", "Product '{product}' added to inventory.", product=product.name)
 
     def remove_product(self, product: Product):
-        self.products.remove(product)
+        self._unindex(self.products.pop(product.name))
         self.notify(product, action="remove")
-        print(f"Product '{product.name}' removed from inventory.")
+        logger.info("inventory.product_removed", "Product '{product}' removed from inventory.", product=product.name)
 
     def get_product(self, product_name: str):
-        for product in self.products:
-            if product.name == product_name:
-                return product
-        return None
+        return self.products.get(product_name)
+
+    def notify(self, product: Product, action: str):
+        super().notify(product, action=action)
+        self.events.publish(product, action)
+
+    def get_product_by_sku(self, sku: str):
+        return self.by_sku.get(sku)
+
+    def get_products_by_category(self, category: str) -> list:
+        return list(self.by_category.get(category, {}).values())
+
+    # Products priced within [min_price, max_price], visiting only the buckets in the range
+    def get_products_in_price_range(self, min_price: float, max_price: float) -> list:
+        first, last = self._price_bucket(min_price), self._price_bucket(max_price)
+        if last - first + 1 <= len(self.by_price_bucket):
+            buckets = (self.by_price_bucket.get(bucket) for bucket in range(first, last + 1))
+        else:
+            buckets = (products for bucket, products in sorted(self.by_price_bucket.items()) if first <= bucket <= last)
+        return [product for products in buckets if products for product in products.values()
+                if min_price <= product.price <= max_price]
+
+    # Prices are indexed, so change them through the inventory
+    def update_price(self, product_name: str, price: float):
+        product = self.products[product_name]
+        self._unindex(product)
+        product.price = price
+        self._index(product)
+        self.notify(product, action="price")
+
+    def _price_bucket(self, price: float) -> int:
+        return math.floor(price / self.price_bucket_width)
+
+    def _index(self, product: Product):
+        if product.sku is not None:
+            self.by_sku[product.sku] = product
+        if product.category is not None:
+            self.by_category[product.category][product.name] = product
+        self.by_price_bucket[self._price_bucket(product.price)][product.name] = product
+
+    def _unindex(self, product: Product):
+        if product.sku is not None and self.by_sku.get(product.sku) is product:
+            del self.by_sku[product.sku]
+        if product.category is not None:
+            self._discard(self.by_category, product.category, product)
+        self._discard(self.by_price_bucket, self._price_bucket(product.price), product)
+
+    @staticmethod
+    def _discard(index: dict, key, product: Product):
+        products = index.get(key)
+        if products is not None and products.get(product.name) is product:
+            del products[product.name]
+            if not products:
+                del index[key]
+
+def to_cents(amount: float) -> int:
+    return round(amount * 100)
+
+# Percentage discount on order lines, for one product, one category, or (with neither) every
+# product; applies once a line holds at least min_quantity units
+class LinePromotion:
+    def __init__(self, promotion_id: str, percent_off: float, product_name: str = None, category: str = None,
+                 min_quantity: int = 1):
+        self.promotion_id = promotion_id
+        self.percent_off = percent_off
+        self.product_name = product_name
+        self.category = category
+        self.min_quantity = min_quantity
+
+    def applies_to(self, product: Product, quantity: int) -> bool:
+        return (quantity >= self.min_quantity
+                and (self.product_name is None or self.product_name == product.name)
+                and (self.category is None or self.category == product.category))
+
+# Fixed discount on the whole cart once its discounted subtotal reaches min_subtotal
+class CartPromotion:
+    def __init__(self, promotion_id: str, amount_off: float, min_subtotal: float):
+        self.promotion_id = promotion_id
+        self.amount_off = amount_off
+        self.min_subtotal = min_subtotal
+
+# Promotion rules compiled into indexes: line promotions by product name and by category (plus
+# the sitewide ones), and cart promotions as thresholds sorted by min_subtotal with the best
+# discount reachable at each. Pricing a line only looks at the rules indexed under its product
+# and category; the cart discount is a binary search. A rule naming both a product and a
+# category is indexed by product and still checks the category. Each line gets its best
+# promotion (they do not stack) and the cart gets its best cart promotion. Amounts are integer cents.
+class PromotionEngine:
+    def __init__(self):
+        self.by_product = defaultdict(list)
+        self.by_category = defaultdict(list)
+        self.sitewide = []
+        self.cart_promotions = []
+        self.cart_thresholds = []  # Sorted min_subtotal in cents
+        self.cart_best = []  # Best amount_off in cents at or below each threshold
+        self.version = 0  # Bumped on every rule change, so cached cart prices are recomputed
+
+    def add_promotion(self, promotion):
+        if isinstance(promotion, CartPromotion):
+            self.cart_promotions.append(promotion)
+            self._compile_cart_promotions()
+        else:
+            self._line_rules(promotion).append(promotion)
+        self.version += 1
+
+    def remove_promotion(self, promotion):
+        if isinstance(promotion, CartPromotion):
+            self.cart_promotions.remove(promotion)
+            self._compile_cart_promotions()
+        else:
+            self._line_rules(promotion).remove(promotion)
+        self.version += 1
+
+    def line_cents(self, product: Product, unit_cents: int, quantity: int) -> int:
+        percent_off = 0.0
+        for promotion in self.by_product.get(product.name, ()):
+            if promotion.applies_to(product, quantity) and promotion.percent_off > percent_off:
+                percent_off = promotion.percent_off
+        for rules in (self.by_category.get(product.category, ()), self.sitewide):
+            for promotion in rules:
+                if promotion.min_quantity <= quantity and promotion.percent_off > percent_off:
+                    percent_off = promotion.percent_off
+        gross = unit_cents * quantity
+        return gross - round(gross * percent_off / 100)
+
+    def cart_discount_cents(self, subtotal_cents: int) -> int:
+        position = bisect.bisect_right(self.cart_thresholds, subtotal_cents)
+        return min(self.cart_best[position - 1], subtotal_cents) if position else 0
+
+    # Prices order items from scratch: total in cents after line and cart promotions
+    def total_cents(self, order_items: list) -> int:
+        subtotal = sum(self.line_cents(product, to_cents(product.price), quantity) for product, quantity in order_items)
+        return subtotal - self.cart_discount_cents(subtotal)
+
+    def _line_rules(self, promotion: LinePromotion) -> list:
+        if promotion.product_name is not None:
+            return self.by_product[promotion.product_name]
+        if promotion.category is not None:
+            return self.by_category[promotion.category]
+        return self.sitewide
+
+    def _compile_cart_promotions(self):
+        ordered = sorted(self.cart_promotions, key=lambda promotion: promotion.min_subtotal)
+        self.cart_thresholds = [to_cents(promotion.min_subtotal) for promotion in ordered]
+        self.cart_best = list(itertools.accumulate((to_cents(promotion.amount_off) for promotion in ordered), max))
+
+# Running price of one cart. Each line keeps a snapshot of its unit price and its discounted
+# total, and the cart keeps the subtotal, so editing a line costs O(1). Lines whose product
+# price changed since the snapshot are marked stale (Customer.update on a "price" event) and
+# are the only ones re-priced at checkout; a change to the promotion rules re-prices them all.
+# total_cents first waits for the inventory events of the cart's products, so price changes
+# published before the call are always reflected. The lock is the owning customer's, shared
+# with the cart.
+class CartPricing:
+    def __init__(self, engine: PromotionEngine, events: InventoryEventBus = None, lock=None):
+        self.engine = engine
+        self.events = events
+        self.lock = lock if lock is not None else threading.RLock()
+        self.lines = {}  # Product -> [quantity, unit price snapshot in cents, line total in cents]
+        self.subtotal_cents = 0
+        self.stale = set()
+        self.engine_version = engine.version
+
+    def set_line(self, product: Product, quantity: int):
+        self.remove_line(product)
+        if quantity > 0:
+            unit_cents = to_cents(product.price)
+            line_cents = self.engine.line_cents(product, unit_cents, quantity)
+            self.lines[product] = [quantity, unit_cents, line_cents]
+            self.subtotal_cents += line_cents
+
+    def remove_line(self, product: Product):
+        line = self.lines.pop(product, None)
+        if line is not None:
+            self.subtotal_cents -= line[2]
+            self.stale.discard(product)
+
+    def mark_stale(self, product: Product):
+        if product in self.lines:
+            self.stale.add(product)
+
+    def clear(self):
+        self.lines.clear()
+        self.stale.clear()
+        self.subtotal_cents = 0
+
+    def total_cents(self) -> int:
+        if self.events is not None and self.events.outstanding:
+            with self.lock:
+                products = list(self.lines)
+            self.events.flush(products)
+        with self.lock:
+            return self.current_total_cents()
+
+    # Total without waiting for pending events; the caller holds the lock
+    def current_total_cents(self) -> int:
+        if self.engine_version != self.engine.version:
+            self.engine_version = self.engine.version
+            self.stale.update(self.lines)
+        while self.stale:
+            product = self.stale.pop()
+            self.set_line(product, self.lines[product][0])
+        return self.subtotal_cents - self.engine.cart_discount_cents(self.subtotal_cents)
+
+    def total(self) -> float:
+        return self.total_cents() / 100
 
 # Customer class representing a customer
 class Customer(Observer):
@@ -59,51 +525,771 @@ class Customer(Observer):
         self.cart = defaultdict(int)  # Dictionary to store product and its quantity in cart
         self.past_orders = {}
         self.payment_type = payment_type
+        self.pricing = None  # CartPricing, set by AmazonEcommercePlatform.enable_cart_pricing
+        self.events = None  # InventoryEventBus, set by AmazonEcommercePlatform.register_customer
+        self.lock = threading.RLock()  # Guards cart and pricing; events arrive on the bus thread
 
     def update(self, product: Product, action: str):
-        if action == "remove" and product in self.cart:
-            del self.cart[product]
+        with self.lock:
+            if action == "remove" and product in self.cart:
+                del self.cart[product]
+                if self.events is not None:
+                    self.events.unsubscribe(product, self)
+                if self.pricing is not None:
+                    self.pricing.remove_line(product)
+            elif action == "price" and self.pricing is not None:
+                self.pricing.mark_stale(product)
 
     def add_to_cart(self, product: Product, quantity: int):
-        self.cart[product] += quantity
-        print(f"Added {quantity} '{product.name}' to the cart.")
+        with self.lock:
+            self.cart[product] += quantity
+            if self.events is not None:
+                self.events.subscribe(product, self)
+            if self.pricing is not None:
+                self.pricing.set_line(product, self.cart[product])
+        logger.info("cart.product_added", "Added {quantity} '{product}' to the cart.", customer_id=self.id,
+                    product=product.name, quantity=quantity)
+
+    # Cart lines once every inventory event published so far (removals, price changes) for the
+    # products in the cart is applied
+    def cart_items(self) -> list:
+        self._flush_events()
+        with self.lock:
+            return list(self.cart.items())
 
     def checkout(self, amazon_ecommerce_platform):
-        if not self.cart:
-            print("Cart is empty. Please add products to the cart.")
+        self._flush_events()
+        with self.lock:
+            order_items = list(self.cart.items())
+            total_price = self.pricing.current_total_cents() / 100 if self.pricing is not None else None
+        if not order_items:
+            logger.warning("checkout.empty_cart", "Cart is empty. Please add products to the cart.", customer_id=self.id)
             return False
 
-        order_items = [(product, quantity) for product, quantity in self.cart.items()]
-        order = Order(self, order_items, self.payment_type)
+        order = Order(self, order_items, self.payment_type, total_price)
         success = amazon_ecommerce_platform.process_order(order)
         if success:
-            order_id = amazon_ecommerce_platform.generate_order_id()
-            self.past_orders[order_id] = order_items.copy()
-            self.cart.clear()
+            # With an order log the history is served from disk (platform.order_log.orders_for)
+            if amazon_ecommerce_platform.order_log is None:
+                self.past_orders[order.order_id] = order_items.copy()
+            self.remove_from_cart(order_items)
             return True
         else:
             return False
 
+    # Takes the ordered quantities out of the cart; anything added after the order was taken stays
+    def remove_from_cart(self, order_items: list):
+        with self.lock:
+            for product, quantity in order_items:
+                remaining = self.cart.get(product, 0) - quantity
+                if remaining > 0:
+                    self.cart[product] = remaining
+                    if self.pricing is not None:
+                        self.pricing.set_line(product, remaining)
+                elif product in self.cart:
+                    del self.cart[product]
+                    if self.events is not None:
+                        self.events.unsubscribe(product, self)
+                    if self.pricing is not None:
+                        self.pricing.remove_line(product)
+
+    def clear_cart(self):
+        with self.lock:
+            if self.events is not None:
+                for product in self.cart:
+                    self.events.unsubscribe(product, self)
+            self.cart.clear()
+            if self.pricing is not None:
+                self.pricing.clear()
+
+    # Waits for the pending inventory events of the products in this cart, not the whole bus;
+    # the lock is not held while waiting, since the events are applied under it
+    def _flush_events(self):
+        if self.events is not None and self.events.outstanding:
+            with self.lock:
+                products = list(self.cart)
+            self.events.flush(products)
+
 # Order class representing a customer order
 class Order:
-    def __init__(self, customer: Customer, order_items: list, payment_type: str):
+    def __init__(self, customer: Customer, order_items: list, payment_type: str, total_price: float = None):
         self.customer = customer
         self.order_items = order_items
         self.payment_type = payment_type
+        self.total_price = total_price  # Precomputed by the cart's pricing; priced at checkout if None
+        self.order_id = None  # Assigned by the platform before stock is reserved
 
 # Payment gateway class to handle payments
 class PaymentGateway:
     def process_payment(self, amount: float, customer: Customer) -> bool:
-        print(f"Processing payment of ${amount} for customer {customer.name} with payment type {customer.payment_type}...")
+        logger.info("payment.processing", "Processing payment of ${amount} for customer {customer} with payment type {payment_type}...",
+                    amount=amount, customer=customer.name, payment_type=customer.payment_type)
         return random.choice([True, False])  # Dummy success/failure for payment
 
+    def refund_payment(self, amount: float, customer: Customer) -> bool:
+        logger.info("payment.refunding", "Refunding ${amount} to customer {customer}...", amount=amount, customer=customer.name)
+        return True
+
+# Raised for transient gateway failures (timeouts, 5xx); these are retried, declines are not
+class PaymentGatewayError(Exception):
+    pass
+
+# Asynchronous payment gateway interface; process_payment returns False for a decline and
+# raises PaymentGatewayError for a transient failure
+class AsyncPaymentGateway(ABC):
+    async def open_connection(self):
+        return None
+
+    @abstractmethod
+    async def process_payment(self, amount: float, customer: Customer, connection=None) -> bool:
+        pass
+
+    # Returns a captured payment; raises PaymentGatewayError for a transient failure
+    @abstractmethod
+    async def refund_payment(self, amount: float, customer: Customer, connection=None) -> bool:
+        pass
+
+# Runs the blocking PaymentGateway in a worker thread; a False result is treated as transient
+class SyncPaymentGatewayAdapter(AsyncPaymentGateway):
+    def __init__(self, gateway: PaymentGateway):
+        self.gateway = gateway
+
+    async def process_payment(self, amount: float, customer: Customer, connection=None) -> bool:
+        if not await asyncio.to_thread(self.gateway.process_payment, amount, customer):
+            raise PaymentGatewayError("payment gateway returned failure")
+        return True
+
+    async def refund_payment(self, amount: float, customer: Customer, connection=None) -> bool:
+        return await asyncio.to_thread(self.gateway.refund_payment, amount, customer)
+
+# Local stand-in gateway that injects latency, transient failures and declines
+class SimulatedPaymentGateway(AsyncPaymentGateway):
+    def __init__(self, latency: float = 0.005, failure_rate: float = 0.0, decline_rate: float = 0.0, seed: int = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.decline_rate = decline_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.refunds = 0
+
+    async def process_payment(self, amount: float, customer: Customer, connection=None) -> bool:
+        self.calls += 1
+        await asyncio.sleep(self.rng.expovariate(1 / self.latency) if self.latency else 0)
+        if self.rng.random() < self.failure_rate:
+            raise PaymentGatewayError("simulated gateway failure")
+        return self.rng.random() >= self.decline_rate
+
+    async def refund_payment(self, amount: float, customer: Customer, connection=None) -> bool:
+        await asyncio.sleep(self.rng.expovariate(1 / self.latency) if self.latency else 0)
+        self.refunds += 1
+        return True
+
+# Fixed-size pool of gateway connections; callers wait for a free connection
+class ConnectionPool:
+    def __init__(self, gateway: AsyncPaymentGateway, size: int = 50):
+        self.gateway = gateway
+        self.size = size
+        self.idle = None  # asyncio.Queue, created in the running loop on first use
+        self.loop = None
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        if self.loop is not asyncio.get_running_loop():
+            self.loop = asyncio.get_running_loop()
+            self.idle = asyncio.Queue()
+            for _ in range(self.size):
+                self.idle.put_nowait(await self.gateway.open_connection())
+        connection = await self.idle.get()
+        try:
+            yield connection
+        finally:
+            self.idle.put_nowait(connection)
+
+# Exponential backoff with full jitter: attempt n waits uniform(0, min(max_delay, base_delay * 2^(n-1)))
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.01, max_delay: float = 1.0, rng: random.Random = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng or random.Random()
+
+    def backoff(self, attempt: int) -> float:
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+# Caps retries to a fraction of traffic: every payment deposits `ratio` tokens and every retry
+# spends one, so a failing gateway sees at most ~(1 + ratio) times normal load instead of max_attempts times
+class RetryBudget:
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10.0, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = min_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+# Circuit breaker: opens after failure_threshold consecutive failures and rejects calls for
+# reset_timeout seconds, then lets a single probe through (half-open) to decide whether to close
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 1.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if self.clock() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self.probing:
+                return False
+            self.probing = True
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = self.clock()
+
+# Payment client combining the connection pool, per-call timeout, bounded retries with
+# backoff, the retry budget and the circuit breaker. Runs on a single event loop.
+class ResilientPaymentClient:
+    def __init__(self, gateway: AsyncPaymentGateway, pool_size: int = 50, timeout: float = 2.0,
+                 retry_policy: RetryPolicy = None, retry_budget: RetryBudget = None, breaker: CircuitBreaker = None):
+        self.gateway = gateway
+        self.pool = ConnectionPool(gateway, pool_size)
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = 0
+        self.rejected = 0  # calls refused by the open circuit
+
+    async def charge(self, amount: float, customer: Customer) -> bool:
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.rejected += 1
+                return False
+            attempt += 1
+            try:
+                async with self.pool.connection() as connection:
+                    approved = await asyncio.wait_for(self.gateway.process_payment(amount, customer, connection), self.timeout)
+            except (PaymentGatewayError, asyncio.TimeoutError):
+                self.breaker.record_failure()
+                if attempt >= self.retry_policy.max_attempts or not self.retry_budget.withdraw():
+                    return False
+                self.retries += 1
+                await asyncio.sleep(self.retry_policy.backoff(attempt))
+                continue
+            except BaseException:
+                # Unexpected errors and cancellation are not retried, but still count as a
+                # failure, so a half-open probe never stays outstanding
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            return approved
+
+    # Refunds skip the circuit breaker and the retry budget, since the money has already been
+    # taken; transient failures are retried up to max_attempts and the last one is raised
+    async def refund(self, amount: float, customer: Customer) -> bool:
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with self.pool.connection() as connection:
+                    return await asyncio.wait_for(self.gateway.refund_payment(amount, customer, connection), self.timeout)
+            except (PaymentGatewayError, asyncio.TimeoutError):
+                if attempt >= self.retry_policy.max_attempts:
+                    raise
+                await asyncio.sleep(self.retry_policy.backoff(attempt))
+
+# Stock held for one order between reserve and commit/release
+class Reservation:
+    def __init__(self, reservation_id: int, lines: list, expires_at: float):
+        self.reservation_id = reservation_id
+        self.lines = lines  # [(inventory Product, quantity)]
+        self.expires_at = expires_at
+
+# Reserves stock for whole orders atomically. Reserving takes the per-product locks of every
+# line in name order (so two orders can never deadlock), checks all lines and deducts them
+# together; orders on different products never wait for each other. A reservation ends exactly
+# once: commit keeps the deduction, release or expiry puts the stock back.
+class StockReservationManager:
+    def __init__(self, inventory: Inventory, timeout: float = 15 * 60, clock=time.monotonic):
+        self.inventory = inventory
+        self.timeout = timeout
+        self.clock = clock
+        self.product_locks = {}  # product name -> Lock, created on first reservation
+        self.active = {}  # reservation id -> Reservation
+        self.ids = itertools.count(1)
+        self.deadlines = []  # heap of (expires_at, reservation id)
+        self.deadlines_lock = threading.Lock()
+
+    def reserve(self, order_items: list):
+        quantities = defaultdict(int)
+        for product, quantity in order_items:
+            quantities[product.name] += quantity
+        names = sorted(quantities)
+        products = [self.inventory.get_product(name) for name in names]
+        if any(product is None for product in products):
+            return None
+
+        locks = [self._lock_for(name) for name in names]
+        for lock in locks:
+            lock.acquire()
+        try:
+            if any(product.count < quantities[product.name] for product in products):
+                return None
+            for product in products:
+                product.count -= quantities[product.name]
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+        reservation = Reservation(next(self.ids), [(product, quantities[product.name]) for product in products],
+                                  self.clock() + self.timeout)
+        self.active[reservation.reservation_id] = reservation
+        with self.deadlines_lock:
+            heapq.heappush(self.deadlines, (reservation.expires_at, reservation.reservation_id))
+        return reservation
+
+    # Keeps the deducted stock; False when the reservation already expired or was released
+    def commit(self, reservation: Reservation) -> bool:
+        return self.active.pop(reservation.reservation_id, None) is not None
+
+    # Returns the stock; False when the reservation already ended
+    def release(self, reservation: Reservation) -> bool:
+        if self.active.pop(reservation.reservation_id, None) is None:
+            return False
+        for product, quantity in reservation.lines:
+            with self._lock_for(product.name):
+                product.count += quantity
+        return True
+
+    # Releases every reservation past its deadline; returns how many were released
+    def expire(self, now: float = None) -> int:
+        now = self.clock() if now is None else now
+        due = []
+        with self.deadlines_lock:
+            while self.deadlines and self.deadlines[0][0] <= now:
+                due.append(heapq.heappop(self.deadlines)[1])
+        reservations = [self.active.get(reservation_id) for reservation_id in due]
+        return sum(self.release(reservation) for reservation in reservations if reservation is not None)
+
+    # Reserves a micro-batch of orders in arrival order with one inventory lookup and one lock
+    # acquisition per distinct product; returns a Reservation, or None when an order does not
+    # fit, for each order
+    def reserve_batch(self, batch_items: list) -> list:
+        batch_quantities = []
+        for order_items in batch_items:
+            quantities = defaultdict(int)
+            for product, quantity in order_items:
+                quantities[product.name] += quantity
+            batch_quantities.append(quantities)
+        names = sorted({name for quantities in batch_quantities for name in quantities})
+        products = {name: self.inventory.get_product(name) for name in names}
+        locks = [self._lock_for(name) for name in names if products[name] is not None]
+
+        granted = []
+        for lock in locks:
+            lock.acquire()
+        try:
+            available = {name: product.count for name, product in products.items() if product is not None}
+            for quantities in batch_quantities:
+                fits = all(available.get(name, -1) >= quantity for name, quantity in quantities.items())
+                if fits:
+                    for name, quantity in quantities.items():
+                        available[name] -= quantity
+                granted.append(fits)
+            for name, count in available.items():
+                products[name].count = count
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+        expires_at = self.clock() + self.timeout
+        reservations = [Reservation(next(self.ids), [(products[name], quantity) for name, quantity in quantities.items()], expires_at)
+                        if fits else None for quantities, fits in zip(batch_quantities, granted)]
+        with self.deadlines_lock:
+            for reservation in reservations:
+                if reservation is not None:
+                    self.active[reservation.reservation_id] = reservation
+                    heapq.heappush(self.deadlines, (expires_at, reservation.reservation_id))
+        return reservations
+
+    # Returns the stock of many reservations with one lock acquisition per product; returns how
+    # many were still active
+    def release_batch(self, reservations: list) -> int:
+        returned = defaultdict(int)
+        products = {}
+        released = 0
+        for reservation in reservations:
+            if self.active.pop(reservation.reservation_id, None) is None:
+                continue
+            released += 1
+            for product, quantity in reservation.lines:
+                returned[product.name] += quantity
+                products[product.name] = product
+        for name in sorted(returned):
+            with self._lock_for(name):
+                products[name].count += returned[name]
+        return released
+
+    def _lock_for(self, name: str) -> threading.Lock:
+        lock = self.product_locks.get(name)
+        if lock is None:
+            lock = self.product_locks.setdefault(name, threading.Lock())
+        return lock
+
 # Amazon e-commerce platform class
+# Snowflake-style order IDs: milliseconds since EPOCH_MS, then the shard, then a per-millisecond
+# sequence. Each worker process uses its own shard, so IDs are unique across processes without
+# coordination and roughly ordered by time. Without a shard_id the shard is taken from the
+# process ID, so separate processes rarely share one; pass shard_id (e.g. the worker index)
+# when uniqueness across processes must be guaranteed. Within a process the sequence comes from
+# itertools.count, whose next() is atomic under the GIL, so threads draw IDs without a lock.
+# The counter never runs ahead of the clock (it waits instead), which keeps IDs unique across
+# restarts; a counter that has fallen far behind an idle clock is replaced under a lock.
+class OrderIdGenerator:
+    EPOCH_MS = 1_704_067_200_000  # 2024-01-01T00:00:00Z
+    SHARD_BITS = 10
+    SEQUENCE_BITS = 12
+    SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+    MAX_SHARD = (1 << SHARD_BITS) - 1
+    MAX_LAG_MS = 1_000
+
+    def __init__(self, shard_id: int = None, clock=time.time):
+        if shard_id is None:
+            shard_id = os.getpid() & self.MAX_SHARD
+        if not 0 <= shard_id <= self.MAX_SHARD:
+            raise ValueError(f"shard_id must be between 0 and {self.MAX_SHARD}")
+        self.shard_id = shard_id
+        self.clock = clock
+        self.shard_bits = shard_id << self.SEQUENCE_BITS
+        self.lock = threading.Lock()
+        self.counter = itertools.count(self._now_ms() << self.SEQUENCE_BITS)
+
+    def next_id(self) -> int:
+        tick = next(self.counter)
+        self._check_clock(tick >> self.SEQUENCE_BITS)
+        return ((tick >> self.SEQUENCE_BITS) << (self.SHARD_BITS + self.SEQUENCE_BITS)) | self.shard_bits | (tick & self.SEQUENCE_MASK)
+
+    # Draws a contiguous block of sequence values in one call and checks the clock once
+    def next_ids(self, count: int) -> list:
+        ticks = list(itertools.islice(self.counter, count))
+        if not ticks:
+            return []
+        self._check_clock(ticks[-1] >> self.SEQUENCE_BITS)
+        sequence_bits, shard_bits, mask = self.SEQUENCE_BITS, self.shard_bits, self.SEQUENCE_MASK
+        timestamp_shift = self.SHARD_BITS + self.SEQUENCE_BITS
+        return [((tick >> sequence_bits) << timestamp_shift) | shard_bits | (tick & mask) for tick in ticks]
+
+    # Splits an ID into (unix time in ms, shard, sequence)
+    @classmethod
+    def decode(cls, order_id: int) -> tuple:
+        sequence = order_id & cls.SEQUENCE_MASK
+        shard = (order_id >> cls.SEQUENCE_BITS) & cls.MAX_SHARD
+        return (order_id >> (cls.SHARD_BITS + cls.SEQUENCE_BITS)) + cls.EPOCH_MS, shard, sequence
+
+    def _now_ms(self) -> int:
+        return int(self.clock() * 1000) - self.EPOCH_MS
+
+    def _check_clock(self, millis: int):
+        now = self._now_ms()
+        if millis > now:
+            # More than 4096 IDs in this millisecond: wait for the clock to catch up
+            while millis > self._now_ms():
+                time.sleep(0.0001)
+        elif now - millis > self.MAX_LAG_MS:
+            self._catch_up(now)
+
+    # Threads still holding the old counter only draw values below the new start, so IDs stay
+    # unique; the value drawn for the re-check is simply skipped
+    def _catch_up(self, now: int):
+        with self.lock:
+            if now - (next(self.counter) >> self.SEQUENCE_BITS) > self.MAX_LAG_MS:
+                self.counter = itertools.count(now << self.SEQUENCE_BITS)
+
+# An order read back from the OrderLog; lines are (product name, quantity, unit price) at the
+# time of the order
+class OrderRecord:
+    def __init__(self, order_id: int, customer_id: int, created_at: float, lines: list):
+        self.order_id = order_id
+        self.customer_id = customer_id
+        self.created_at = created_at
+        self.lines = lines
+
+    def total(self) -> float:
+        return sum(quantity * price for _, quantity, price in self.lines)
+
+# Persistent append-only order log. Orders are packed into binary records in segment files of
+# up to segment_size bytes and read back through mmap. A record is a fixed header (length,
+# CRC32, order ID, customer ID, timestamp, line count) followed by 16 bytes per line (product
+# code, quantity, unit price); product names are stored once in products.log and referenced
+# by code. A per-customer index maps customer IDs to record positions (segment << 32 | offset),
+# so order history is served from the files instead of being held in memory. Opening the log
+# rebuilds the index by scanning record headers and truncates a torn record at the tail.
+class OrderLog:
+    HEADER = struct.Struct("<IIQqqH")
+    MAX_LINES = (1 << 16) - 1  # the header's line count is a uint16
+    LINE = struct.Struct("<IId")
+    PRODUCT = struct.Struct("<H")
+    TAIL_CHECK = 1024 * 1024
+    SNAPSHOT = struct.Struct("<QQQ")
+
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024, sync: bool = False):
+        if not self.HEADER.size < segment_size < 1 << 32:
+            raise ValueError("segment_size must fit one record header and stay below 4 GiB")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync = sync  # fsync after every append
+        self.lock = threading.RLock()
+        self.customer_index = defaultdict(lambda: array('Q'))
+        self.count = 0
+        self.maps = {}  # segment -> mmap of its flushed contents
+        self.product_names = []
+        self.product_codes = {}
+        self._load_products()
+        self.segment, self.file = -1, None
+        segments = sorted(int(name[8:14]) for name in os.listdir(directory)
+                          if name.startswith("segment-") and name.endswith(".log"))
+        start_segment, start_offset = self._load_snapshot(segments)
+        for segment in segments:
+            if segment >= start_segment:
+                self._scan(segment, segment == segments[-1], start_offset if segment == start_segment else 0)
+        self.segment = segments[-1] if segments else 0
+        self.file = open(self._segment_path(self.segment), "ab")
+        self.offset = self.file.tell()
+
+    def append(self, order_id: int, customer_id: int, order_items: list, created_at: float = None) -> int:
+        created_at = time.time() if created_at is None else created_at
+        if len(order_items) > self.MAX_LINES:
+            raise ValueError(f"an order log record holds at most {self.MAX_LINES} lines, got {len(order_items)}")
+        with self.lock:
+            lines = b"".join(self.LINE.pack(self._product_code(product.name), quantity, product.price)
+                             for product, quantity in order_items)
+            length = self.HEADER.size + len(lines)
+            record = bytearray(self.HEADER.pack(length, 0, order_id, customer_id, int(created_at * 1000), len(order_items)))
+            record += lines
+            struct.pack_into("<I", record, 4, zlib.crc32(memoryview(record)[8:]))
+            if self.offset and self.offset + length > self.segment_size:
+                self._roll()
+            position = self.segment << 32 | self.offset
+            self.file.write(record)
+            if self.sync:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            self.offset += length
+            self.customer_index[customer_id].append(position)
+            self.count += 1
+            return position
+
+    # Most recent orders first
+    def orders_for(self, customer_id: int, limit: int = None) -> list:
+        with self.lock:
+            positions = self.customer_index.get(customer_id, ())
+            positions = positions[::-1] if limit is None else positions[:-limit - 1:-1]
+            return [self._read(position) for position in positions]
+
+    # All orders in the order they were written
+    def replay(self):
+        with self.lock:
+            last, end = self.segment, self.offset
+            buffers = [self._map(segment, end if segment == last else 0) for segment in range(last + 1)]
+        for segment, buffer in enumerate(buffers):
+            limit = end if segment == last else len(buffer)
+            offset = 0
+            while offset < limit:
+                yield self._decode(buffer, offset)
+                offset += self.HEADER.unpack_from(buffer, offset)[0]
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+            if self.sync:
+                os.fsync(self.file.fileno())
+                os.fsync(self.products_file.fileno())
+
+    # Closing fsyncs the log and snapshots the customer index, so the next open only scans
+    # records written after the snapshot
+    def close(self):
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            os.fsync(self.products_file.fileno())
+            self._write_snapshot()
+            self.file.close()
+            self.products_file.close()
+            for buffer in self.maps.values():
+                buffer.close()
+            self.maps.clear()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:06d}.log")
+
+    def _roll(self):
+        self.file.close()
+        self.segment += 1
+        self.offset = 0
+        self.file = open(self._segment_path(self.segment), "ab")
+
+    def _load_products(self):
+        path = os.path.join(self.directory, "products.log")
+        with open(path, "ab+") as products_file:
+            products_file.seek(0)
+            data = products_file.read()
+        offset = 0
+        while offset + self.PRODUCT.size <= len(data):
+            (size,) = self.PRODUCT.unpack_from(data, offset)
+            if offset + self.PRODUCT.size + size > len(data):
+                break
+            name = data[offset + self.PRODUCT.size:offset + self.PRODUCT.size + size].decode()
+            self.product_codes[name] = len(self.product_names)
+            self.product_names.append(name)
+            offset += self.PRODUCT.size + size
+        self.products_file = open(path, "r+b")
+        self.products_file.truncate(offset)
+        self.products_file.seek(offset)
+
+    # Product names are flushed before any record that refers to them, and with sync fsynced
+    # too, so a durable record never refers to a code that a crash could lose
+    def _product_code(self, name: str) -> int:
+        code = self.product_codes.get(name)
+        if code is None:
+            encoded = name.encode()
+            self.products_file.write(self.PRODUCT.pack(len(encoded)) + encoded)
+            self.products_file.flush()
+            if self.sync:
+                os.fsync(self.products_file.fileno())
+            code = self.product_codes[name] = len(self.product_names)
+            self.product_names.append(name)
+        return code
+
+    # Indexes every complete record of a segment; torn records at the end of the last segment
+    # (from a crash mid-write) are cut off. Record lengths are checked everywhere, but CRCs only
+    # within the last TAIL_CHECK bytes, since unflushed pages can only be lost at the tail.
+    def _scan(self, segment: int, last: bool, offset: int = 0):
+        buffer = self._map(segment)
+        unpack_from, header_size, line_size = self.HEADER.unpack_from, self.HEADER.size, self.LINE.size
+        check_from = len(buffer) - self.TAIL_CHECK if last else len(buffer)
+        index = self.customer_index
+        base = segment << 32
+        while offset + header_size <= len(buffer):
+            length, crc, _, customer_id, _, line_count = unpack_from(buffer, offset)
+            if (length != header_size + line_count * line_size or offset + length > len(buffer)
+                    or offset >= check_from and zlib.crc32(buffer[offset + 8:offset + length]) != crc):
+                break
+            index[customer_id].append(base | offset)
+            self.count += 1
+            offset += length
+        if offset < len(buffer):
+            if not last:
+                raise ValueError(f"corrupt record in {self._segment_path(segment)} at offset {offset}")
+            self.maps.pop(segment).close()
+            with open(self._segment_path(segment), "r+b") as segment_file:
+                segment_file.truncate(offset)
+
+    # Snapshot layout: SNAPSHOT header (end position, customers, orders), then the customer IDs,
+    # their order counts and all positions grouped by customer
+    def _write_snapshot(self):
+        customer_ids = array('q', self.customer_index)
+        counts = array('I', (len(positions) for positions in self.customer_index.values()))
+        path = os.path.join(self.directory, "index.snapshot")
+        with open(path + ".tmp", "wb") as snapshot:
+            snapshot.write(self.SNAPSHOT.pack(self.segment << 32 | self.offset, len(customer_ids), self.count))
+            customer_ids.tofile(snapshot)
+            counts.tofile(snapshot)
+            for positions in self.customer_index.values():
+                positions.tofile(snapshot)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(path + ".tmp", path)
+
+    # Loads the index snapshot if it still describes a prefix of the log; returns where the scan
+    # of newer records should start
+    def _load_snapshot(self, segments: list) -> tuple:
+        path = os.path.join(self.directory, "index.snapshot")
+        if not segments or not os.path.exists(path):
+            return 0, 0
+        with open(path, "rb") as snapshot:
+            end, customers, count = self.SNAPSHOT.unpack(snapshot.read(self.SNAPSHOT.size))
+            segment, offset = end >> 32, end & 0xFFFFFFFF
+            if segment not in segments or os.path.getsize(self._segment_path(segment)) < offset:
+                return 0, 0
+            customer_ids, counts, positions = array('q'), array('I'), array('Q')
+            customer_ids.fromfile(snapshot, customers)
+            counts.fromfile(snapshot, customers)
+            positions.fromfile(snapshot, count)
+        start = 0
+        for customer_id, customer_count in zip(customer_ids, counts):
+            self.customer_index[customer_id] = positions[start:start + customer_count]
+            start += customer_count
+        self.count = count
+        return segment, offset
+
+    # Maps a segment, remapping the active one when it has grown past the mapped length; a
+    # replaced mapping is left to the garbage collector since a replay may still be reading it
+    def _map(self, segment: int, needed: int = 0):
+        buffer = self.maps.get(segment)
+        if buffer is None or len(buffer) < needed:
+            if segment == self.segment:
+                self.file.flush()
+            size = os.path.getsize(self._segment_path(segment))
+            if size == 0:
+                return b""
+            with open(self._segment_path(segment), "rb") as segment_file:
+                buffer = mmap.mmap(segment_file.fileno(), size, access=mmap.ACCESS_READ)
+            self.maps[segment] = buffer
+        return buffer
+
+    def _read(self, position: int) -> OrderRecord:
+        segment, offset = position >> 32, position & 0xFFFFFFFF
+        buffer = self._map(segment, offset + self.HEADER.size)
+        return self._decode(self._map(segment, offset + self.HEADER.unpack_from(buffer, offset)[0]), offset)
+
+    def _decode(self, buffer, offset: int) -> OrderRecord:
+        _, _, order_id, customer_id, created_at, line_count = self.HEADER.unpack_from(buffer, offset)
+        names = self.product_names
+        lines = [(names[code], quantity, price) for code, quantity, price
+                 in self.LINE.iter_unpack(buffer[offset + self.HEADER.size:offset + self.HEADER.size + line_count * self.LINE.size])]
+        return OrderRecord(order_id, customer_id, created_at / 1000, lines)
+
 class AmazonEcommercePlatform:
-    def __init__(self):
+    def __init__(self, shard_id: int = None, order_log: OrderLog = None):
         self.inventory = Inventory()
         self.payment_gateway = PaymentGateway()
-        self.orders = defaultdict(list)
-        self.order_counter = 1000  # Starting order ID counter
+        self.reservations = StockReservationManager(self.inventory)
+        self.payment_client = None  # ResilientPaymentClient for process_order_async
+        self.promotions = PromotionEngine()
+        self.max_payment_attempts = 3
+        self.orders = defaultdict(list)  # In-memory order history, used when there is no order log
+        self.order_log = order_log
+        self.id_generator = OrderIdGenerator(shard_id)
 
     def add_product_to_inventory(self, product: Product):
         self.inventory.add_product(product)
@@ -111,27 +1297,127 @@ class AmazonEcommercePlatform:
     def remove_product_from_inventory(self, product: Product):
         self.inventory.remove_product(product)
 
+    # Stock is reserved for all order lines before payment and committed only once payment
+    # succeeds, so concurrent checkouts cannot sell the same units twice
     def process_order(self, order: Order) -> bool:
-        total_price = sum(product.price * quantity for product, quantity in order.order_items)
-        if not self.check_inventory(order.order_items):
-            print("Insufficient quantity in inventory.")
+        if order.order_id is None:
+            order.order_id = self.generate_order_id()
+        total_price = self.order_total(order)
+        self.reservations.expire()
+        reservation = self.reservations.reserve(order.order_items)
+        if reservation is None:
+            logger.warning("order.insufficient_stock", "Insufficient quantity in inventory.", order_id=order.order_id)
             return False
-        while True:
-            success = self.payment_gateway.process_payment(total_price, order.customer)
-            if not success:
-                print("Payment processing failed. Retrying .... ")
-            else:
-                break
+        success = False  # max_payment_attempts below 1 takes no payment and fails the order
+        try:
+            for attempt in range(1, self.max_payment_attempts + 1):
+                success = self.payment_gateway.process_payment(total_price, order.customer)
+                if success:
+                    break
+                if attempt < self.max_payment_attempts:
+                    logger.warning("payment.retry", "Payment processing failed. Retrying .... ", order_id=order.order_id,
+                                   attempt=attempt)
+        except Exception:
+            self.reservations.release(reservation)
+            raise
+        if self._complete_order(order, reservation, success):
+            return True
         if success:
-            self.orders[order.customer.id].append(order.order_items)
-            for product, quantity in order.order_items:
-                self.update_inventory(product, quantity)
-            print("Order processed successfully.")
+            try:
+                refunded = self.payment_gateway.refund_payment(total_price, order.customer)
+            except Exception:
+                refunded = False
+            self.refund_order(order, refunded)
+        return False
+
+    # Asynchronous checkout through the resilient payment client (pool, backoff, retry budget
+    # and circuit breaker); by default the client wraps payment_gateway
+    async def process_order_async(self, order: Order) -> bool:
+        if self.payment_client is None:
+            self.payment_client = ResilientPaymentClient(SyncPaymentGatewayAdapter(self.payment_gateway))
+        if order.order_id is None:
+            order.order_id = self.generate_order_id()
+        total_price = self.order_total(order)
+        self.reservations.expire()
+        reservation = self.reservations.reserve(order.order_items)
+        if reservation is None:
+            logger.warning("order.insufficient_stock", "Insufficient quantity in inventory.", order_id=order.order_id)
+            return False
+        try:
+            success = await self.payment_client.charge(total_price, order.customer)
+        except BaseException:
+            self.reservations.release(reservation)
+            raise
+        if self._complete_order(order, reservation, success):
+            return True
+        if success:
+            try:
+                refunded = await self.payment_client.refund(total_price, order.customer)
+            except Exception:
+                refunded = False
+            self.refund_order(order, refunded)
+        return False
+
+    # Keeps the stock of a paid order. A payment that completed after its reservation expired is
+    # honoured when the stock can be reserved again; False means the payment must be refunded.
+    def settle_paid_order(self, order: Order, reservation: Reservation) -> bool:
+        if self.reservations.commit(reservation):
+            return True
+        renewed = self.reservations.reserve(order.order_items)
+        if renewed is None or not self.reservations.commit(renewed):
+            logger.warning("order.reservation_expired", "Reservation expired before payment completed and the stock is gone.",
+                           order_id=order.order_id)
+            return False
+        logger.info("order.reservation_renewed", "Reservation expired before payment completed; stock reserved again.",
+                    order_id=order.order_id)
+        return True
+
+    def refund_order(self, order: Order, refunded: bool):
+        if refunded:
+            logger.warning("order.refunded", "Payment refunded.", order_id=order.order_id)
+        else:
+            logger.error("order.refund_failed", "Payment could not be refunded.", order_id=order.order_id)
+
+    def _complete_order(self, order: Order, reservation: Reservation, success: bool) -> bool:
+        if success and self.settle_paid_order(order, reservation):
+            self.record_order(order)
+            logger.info("order.processed", "Order processed successfully.", order_id=order.order_id)
             return True
+        elif success:
+            return False
         else:
-            print("Payment processing failed.")
+            self.reservations.release(reservation)
+            logger.warning("order.payment_failed", "Payment processing failed.", order_id=order.order_id)
             return False
 
+    # Subscribes the customer to inventory events for the products in their cart, now and as
+    # the cart changes
+    def register_customer(self, customer: Customer):
+        with customer.lock:
+            customer.events = self.inventory.events
+            for product in customer.cart:
+                customer.events.subscribe(product, customer)
+
+    # Gives the customer's cart an incrementally maintained price; the customer is registered
+    # for inventory events so price changes mark the affected lines stale
+    def enable_cart_pricing(self, customer: Customer):
+        with customer.lock:
+            customer.pricing = CartPricing(self.promotions, self.inventory.events, customer.lock)
+            for product, quantity in customer.cart.items():
+                customer.pricing.set_line(product, quantity)
+            self.register_customer(customer)
+
+    def order_total(self, order: Order) -> float:
+        if order.total_price is not None:
+            return order.total_price
+        return self.promotions.total_cents(order.order_items) / 100
+
+    def record_order(self, order: Order):
+        if self.order_log is not None:
+            self.order_log.append(order.order_id, order.customer.id, order.order_items)
+        else:
+            self.orders[order.customer.id].append(order.order_items)
+
     def check_inventory(self, order_items: list) -> bool:
         for product, quantity in order_items:
             inventory_product = self.inventory.get_product(product.name)
@@ -143,9 +1429,796 @@ class AmazonEcommercePlatform:
         inventory_product = self.inventory.get_product(product.name)
         inventory_product.count -= quantity
 
-    def generate_order_id(self):
-        self.order_counter += 1
-        return self.order_counter
+    def generate_order_id(self) -> int:
+        return self.id_generator.next_id()
+
+    def generate_order_ids(self, count: int) -> list:
+        return self.id_generator.next_ids(count)
+
+# Log-linear latency histogram: exact up to 16 us, then 8 sub-buckets per power of two, so any
+# percentile is reported within 12.5% while recording stays O(1) and memory stays fixed
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        micros = int(seconds * 1e6)
+        if micros < 16:
+            bucket = max(micros, 0)
+        else:
+            shift = micros.bit_length() - 4
+            bucket = 16 + (shift - 1) * 8 + (micros >> shift) - 8
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other: 'LatencyHistogram'):
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    # Upper bound of the bucket holding the q-th sample, in seconds
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(q * self.count))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                break
+        if bucket < 16:
+            upper = bucket + 1
+        else:
+            shift = (bucket - 16) // 8 + 1
+            upper = ((bucket - 16) % 8 + 9) << shift
+        return min(upper / 1e6, self.max)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1e3 if self.count else 0.0,
+            "p50_ms": self.percentile(0.50) * 1e3,
+            "p99_ms": self.percentile(0.99) * 1e3,
+            "p999_ms": self.percentile(0.999) * 1e3,
+            "max_ms": self.max * 1e3,
+        }
+
+# Staged checkout for flash-sale traffic. Carts are grouped into micro-batches; each batch is
+# reserved with one inventory lookup per product (reserve_batch), its payments run concurrently
+# through the platform's payment client, and results are committed in bulk. Order IDs are
+# assigned as each batch is reserved. Up to max_batches_in_flight batches are in the payment
+# stage while the next ones are reserved.
+class CheckoutPipeline:
+    STAGES = ("inventory", "payment", "commit", "batch")
+
+    def __init__(self, platform: AmazonEcommercePlatform, batch_size: int = 256, max_batches_in_flight: int = 4):
+        self.platform = platform
+        self.batch_size = batch_size
+        self.max_batches_in_flight = max_batches_in_flight
+        self.histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+
+    # Checks out every customer's cart; returns the order ID per customer, or None when the
+    # cart was empty, out of stock or not paid
+    async def checkout(self, customers: list) -> list:
+        if self.platform.payment_client is None:
+            self.platform.payment_client = ResilientPaymentClient(SyncPaymentGatewayAdapter(self.platform.payment_gateway))
+        results = [None] * len(customers)
+        in_flight = asyncio.Queue(maxsize=self.max_batches_in_flight)
+        committer = asyncio.create_task(self._commit_stage(in_flight, results))
+        try:
+            for start in range(0, len(customers), self.batch_size):
+                started = time.perf_counter()
+                batch, orders = [], []
+                for index, customer in enumerate(customers[start:start + self.batch_size], start):
+                    order_items = customer.cart_items()
+                    if order_items:
+                        batch.append((index, customer))
+                        orders.append(Order(customer, order_items, customer.payment_type))
+                for order, order_id in zip(orders, self.platform.generate_order_ids(len(orders))):
+                    order.order_id = order_id
+                self.platform.reservations.expire()
+                reservations = self.platform.reservations.reserve_batch([order.order_items for order in orders])
+                self.histograms["inventory"].record(time.perf_counter() - started)
+                payments = asyncio.create_task(self._payment_stage(orders, reservations))
+                await in_flight.put((started, batch, orders, reservations, payments))
+        finally:
+            await in_flight.put(None)
+            await committer
+        return results
+
+    def report(self) -> dict:
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    async def _payment_stage(self, orders: list, reservations: list) -> list:
+        started = time.perf_counter()
+        client = self.platform.payment_client
+
+        async def pay(order: Order, reservation: Reservation) -> bool:
+            if reservation is None:
+                return False
+            total_price = self.platform.order_total(order)
+            return await client.charge(total_price, order.customer)
+
+        paid = await asyncio.gather(*(pay(order, reservation) for order, reservation in zip(orders, reservations)),
+                                    return_exceptions=True)
+        self.histograms["payment"].record(time.perf_counter() - started)
+        return [outcome is True for outcome in paid]
+
+    async def _refund(self, orders: list):
+        client = self.platform.payment_client
+        refunded = await asyncio.gather(*(client.refund(self.platform.order_total(order), order.customer) for order in orders),
+                                        return_exceptions=True)
+        for order, outcome in zip(orders, refunded):
+            self.platform.refund_order(order, outcome is True)
+
+    async def _commit_stage(self, in_flight: asyncio.Queue, results: list):
+        while True:
+            item = await in_flight.get()
+            if item is None:
+                return
+            started, batch, orders, reservations, payments = item
+            paid = await payments
+            commit_started = time.perf_counter()
+            committed, unsettled = [], []
+            for position, (order, reservation, ok) in enumerate(zip(orders, reservations, paid)):
+                if ok and reservation is not None:
+                    if self.platform.settle_paid_order(order, reservation):
+                        committed.append(position)
+                    else:
+                        unsettled.append(order)
+            self.platform.reservations.release_batch([reservation for reservation, ok in zip(reservations, paid)
+                                                      if reservation is not None and not ok])
+            if unsettled:
+                await self._refund(unsettled)
+            for position in committed:
+                index, customer = batch[position]
+                order = orders[position]
+                self.platform.record_order(order)
+                if self.platform.order_log is None:
+                    customer.past_orders[order.order_id] = order.order_items
+                customer.remove_from_cart(order.order_items)
+                results[index] = order.order_id
+            finished = time.perf_counter()
+            self.histograms["commit"].record(finished - commit_started)
+            self.histograms["batch"].record(finished - started)
+
+# Payment gateway that approves every payment, so benchmarks measure the platform itself
+class ApprovingPaymentGateway(PaymentGateway):
+    def process_payment(self, amount: float, customer: Customer) -> bool:
+        return True
+
+# Inventory with the original list-scan lookup, kept as the benchmark baseline
+class ScanInventory(Inventory):
+    def get_product(self, product_name: str):
+        for product in self.products.values():
+            if product.name == product_name:
+                return product
+        return None
+
+# Benchmark of checkout against growing catalogues with indexed and list-scan lookups.
+# The scan is O(catalogue) per order line, so it gets fewer orders at large sizes.
+def benchmark_inventory_lookup(sizes=(10_000, 100_000, 1_000_000), orders: int = 2_000, lines_per_order: int = 5, seed: int = 1):
+    print(f"{'products':>10} {'indexed orders/s':>17} {'scan orders/s':>14} {'speedup':>8}")
+    for size in sizes:
+        rates = {}
+        for inventory_class in (Inventory, ScanInventory):
+            rng = random.Random(seed)
+            platform = AmazonEcommercePlatform()
+            platform.inventory = platform.reservations.inventory = inventory_class()
+            platform.payment_gateway = ApprovingPaymentGateway()
+            with logger.disabled():
+                for i in range(size):
+                    platform.add_product_to_inventory(Product(f"product-{i}", rng.uniform(1, 500), 10**9,
+                                                              sku=f"SKU{i:08d}", category=f"category-{i % 100}"))
+            catalogue = list(platform.inventory.products.values())
+            customer = Customer(1, "Benchmark", "Credit Card")
+            order_count = orders if inventory_class is Inventory else max(5, min(orders, 20_000_000 // size // lines_per_order))
+            order_batch = [Order(customer, [(rng.choice(catalogue), 1) for _ in range(lines_per_order)], customer.payment_type)
+                           for _ in range(order_count)]
+            with logger.disabled():
+                start = time.perf_counter()
+                for order in order_batch:
+                    platform.process_order(order)
+                rates[inventory_class] = order_count / (time.perf_counter() - start)
+        print(f"{size:>10} {rates[Inventory]:>17.0f} {rates[ScanInventory]:>14.1f} {rates[Inventory] / rates[ScanInventory]:>7.0f}x")
+
+# Payment gateway that approves after a short delay, widening the window between the stock
+# check and the stock update the way a real gateway call does
+class SlowApprovingPaymentGateway(PaymentGateway):
+    def __init__(self, delay: float = 0.0005):
+        self.delay = delay
+
+    def process_payment(self, amount: float, customer: Customer) -> bool:
+        time.sleep(self.delay)
+        return True
+
+# Oversell stress test: threads check out random carts against scarce stock. The old
+# check-pay-update sequence is run alongside for comparison; with reservations the units sold
+# must equal the stock deducted and no count may go negative. Also reports throughput per
+# thread count for orders on disjoint products.
+def benchmark_concurrent_checkout(thread_counts=(1, 2, 4, 8, 16), products: int = 20, stock: int = 200,
+                                  orders_per_thread: int = 500, seed: int = 9):
+    def run(thread_count: int, reserved: bool, disjoint: bool):
+        platform = AmazonEcommercePlatform()
+        platform.payment_gateway = SlowApprovingPaymentGateway()
+        product_count = products * thread_count if disjoint else products
+        with logger.disabled():
+            for i in range(product_count):
+                platform.add_product_to_inventory(Product(f"product-{i}", 10.0, stock))
+        catalogue = list(platform.inventory.products.values())
+        sold = [defaultdict(int) for _ in range(thread_count)]
+        barrier = threading.Barrier(thread_count + 1)
+
+        def worker(index: int):
+            rng = random.Random(seed + index)
+            customer = Customer(index, f"customer-{index}", "Credit Card")
+            pool = catalogue[index * products:(index + 1) * products] if disjoint else catalogue
+            barrier.wait()
+            for _ in range(orders_per_thread):
+                items = [(product, rng.randint(1, 3)) for product in rng.sample(pool, 3)]
+                if reserved:
+                    placed = platform.process_order(Order(customer, items, customer.payment_type))
+                else:
+                    placed = platform.check_inventory(items)
+                    if placed:
+                        platform.payment_gateway.process_payment(0.0, customer)
+                        for product, quantity in items:
+                            platform.update_inventory(product, quantity)
+                if placed:
+                    for product, quantity in items:
+                        sold[index][product.name] += quantity
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        with logger.disabled():
+            barrier.wait()
+            start = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        oversold = sum(max(0, -product.count) for product in catalogue)
+        units = sum(sum(counts.values()) for counts in sold)
+        return oversold, units, stock * product_count - sum(product.count for product in catalogue), elapsed
+
+    oversold, units, deducted, _ = run(8, reserved=False, disjoint=False)
+    print(f"check-then-update, 8 threads: sold {units} units, deducted {deducted}, oversold {oversold}")
+    oversold, units, deducted, _ = run(8, reserved=True, disjoint=False)
+    assert oversold == 0 and units == deducted, "reservations oversold stock"
+    print(f"reservations,      8 threads: sold {units} units, deducted {deducted}, oversold {oversold}")
+
+    print(f"{'threads':>8} {'orders/s (disjoint products)':>29}")
+    for thread_count in thread_counts:
+        oversold, units, deducted, elapsed = run(thread_count, reserved=True, disjoint=True)
+        assert oversold == 0 and units == deducted
+        print(f"{thread_count:>8} {thread_count * orders_per_thread / elapsed:>29.0f}")
+
+# Benchmark of async checkout throughput against the simulated gateway at several failure rates
+def benchmark_payment_resilience(failure_rates=(0.0, 0.05, 0.2, 0.5, 0.9, 1.0), orders: int = 5_000,
+                                 concurrency: int = 500, latency: float = 0.005, seed: int = 4):
+    print(f"{'failure rate':>12} {'orders/s':>9} {'placed':>7} {'gateway calls':>14} {'retries':>8} {'breaker trips':>14} {'rejected':>9}")
+    for failure_rate in failure_rates:
+        platform = AmazonEcommercePlatform()
+        with logger.disabled():
+            platform.add_product_to_inventory(Product("Widget", 5.0, orders * 10))
+        gateway = SimulatedPaymentGateway(latency=latency, failure_rate=failure_rate, seed=seed)
+        platform.payment_client = ResilientPaymentClient(gateway, retry_policy=RetryPolicy(rng=random.Random(seed)),
+                                                         breaker=CircuitBreaker(reset_timeout=0.05))
+        customer = Customer(1, "Benchmark", "Credit Card")
+        product = platform.inventory.get_product("Widget")
+
+        async def drive():
+            limit = asyncio.Semaphore(concurrency)
+
+            async def one():
+                async with limit:
+                    return await platform.process_order_async(Order(customer, [(product, 1)], customer.payment_type))
+
+            return await asyncio.gather(*(one() for _ in range(orders)))
+
+        with logger.disabled():
+            start = time.perf_counter()
+            placed = sum(asyncio.run(drive()))
+            elapsed = time.perf_counter() - start
+        client = platform.payment_client
+        print(f"{failure_rate:>12.2f} {orders / elapsed:>9.0f} {placed:>7} {gateway.calls:>14} {client.retries:>8} "
+              f"{client.breaker.trips:>14} {client.rejected:>9}")
+
+# Benchmark of flash-sale checkout: carts of 1-5 lines over a catalogue with skewed popularity,
+# checked out one at a time through process_order_async versus through the pipeline
+def benchmark_flash_sale(carts: int = 20_000, sequential_carts: int = 500, products: int = 1_000,
+                         latency: float = 0.005, failure_rate: float = 0.02, seed: int = 12):
+    def setup(count: int):
+        rng = random.Random(seed)
+        platform = AmazonEcommercePlatform()
+        with logger.disabled():
+            for i in range(products):
+                platform.add_product_to_inventory(Product(f"product-{i}", rng.uniform(1, 100), carts))
+            catalogue = list(platform.inventory.products.values())
+            weights = [1 / (rank + 1) for rank in range(products)]
+            customers = []
+            for i in range(count):
+                customer = Customer(i, f"customer-{i}", "Credit Card")
+                for product in set(rng.choices(catalogue, weights, k=rng.randint(1, 5))):
+                    customer.add_to_cart(product, rng.randint(1, 2))
+                customers.append(customer)
+        platform.payment_client = ResilientPaymentClient(
+            SimulatedPaymentGateway(latency=latency, failure_rate=failure_rate, seed=seed), pool_size=256,
+            retry_policy=RetryPolicy(rng=random.Random(seed)))
+        return platform, customers
+
+    platform, customers = setup(sequential_carts)
+
+    async def one_at_a_time():
+        for customer in customers:
+            order = Order(customer, list(customer.cart.items()), customer.payment_type)
+            await platform.process_order_async(order)
+
+    with logger.disabled():
+        start = time.perf_counter()
+        asyncio.run(one_at_a_time())
+        sequential_rate = sequential_carts / (time.perf_counter() - start)
+
+    platform, customers = setup(carts)
+    pipeline = CheckoutPipeline(platform)
+    start = time.perf_counter()
+    placed = sum(order_id is not None for order_id in asyncio.run(pipeline.checkout(customers)))
+    pipeline_rate = carts / (time.perf_counter() - start)
+
+    print(f"one cart at a time: {sequential_rate:>8.0f} carts/s")
+    print(f"pipeline:           {pipeline_rate:>8.0f} carts/s ({placed} of {carts} placed)")
+    print(f"{'stage':>10} {'count':>6} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for stage, summary in pipeline.report().items():
+        print(f"{stage:>10} {summary['count']:>6} {summary['mean_ms']:>8.2f} {summary['p50_ms']:>8.2f} "
+              f"{summary['p99_ms']:>8.2f} {summary['max_ms']:>8.2f}")
+
+# Draws IDs for one shard from several threads sharing one generator, in blocks of block_size;
+# returns the IDs and the time taken. Runs in a worker process for the multi-process check.
+def generate_order_ids_worker(shard_id: int, count: int, threads: int, block_size: int = 1_000) -> tuple:
+    generator = OrderIdGenerator(shard_id)
+    results = [[] for _ in range(threads)]
+
+    def draw(ids: list):
+        for _ in range(count // threads // block_size):
+            ids.extend(generator.next_ids(block_size))
+
+    workers = [threading.Thread(target=draw, args=(ids,)) for ids in results]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [order_id for ids in results for order_id in ids], time.perf_counter() - start
+
+# Uniqueness check and throughput of OrderIdGenerator: one ID per call, blocks of IDs, many
+# threads on one shard, and one shard per process. IDs are capped at 4096 per ms per shard.
+def benchmark_order_ids(count: int = 1_000_000, threads: int = 8, processes: int = 4):
+    from concurrent.futures import ProcessPoolExecutor
+
+    generator = OrderIdGenerator(shard_id=0)
+    start = time.perf_counter()
+    ids = [generator.next_id() for _ in range(count)]
+    elapsed = time.perf_counter() - start
+    assert len(set(ids)) == count and ids == sorted(ids)
+    print(f"next_id, 1 thread:         {count / elapsed / 1e6:>5.2f}M ids/s")
+
+    ids, elapsed = generate_order_ids_worker(1, count, 1)
+    assert len(set(ids)) == count and ids == sorted(ids)
+    print(f"next_ids, 1 thread:        {count / elapsed / 1e6:>5.2f}M ids/s")
+
+    ids, elapsed = generate_order_ids_worker(2, count, threads)
+    assert len(set(ids)) == len(ids)
+    print(f"next_ids, {threads} threads:       {len(ids) / elapsed / 1e6:>5.2f}M ids/s")
+
+    with ProcessPoolExecutor(processes) as pool:
+        results = list(pool.map(generate_order_ids_worker, range(processes), [count] * processes, [threads] * processes))
+    ids = [order_id for batch, _ in results for order_id in batch]
+    assert len(set(ids)) == len(ids)
+    assert all({OrderIdGenerator.decode(order_id)[1] for order_id in batch} == {shard}
+               for shard, (batch, _) in enumerate(results))
+    elapsed = max(elapsed for _, elapsed in results)
+    print(f"next_ids, {processes} processes:     {len(ids) / elapsed / 1e6:>5.2f}M ids/s ({len(ids)} unique across shards)")
+
+# Write throughput, startup replay and per-customer query latency of the OrderLog, with the
+# size of the same history held in memory as (Product, quantity) lists for comparison
+def benchmark_order_log(orders: int = 1_000_000, customers: int = 50_000, products: int = 10_000,
+                        queries: int = 10_000, seed: int = 14):
+    import shutil
+    import tempfile
+    import tracemalloc
+
+    rng = random.Random(seed)
+    catalogue = [Product(f"product-{i}", round(rng.uniform(1, 500), 2), 1_000) for i in range(products)]
+    carts = [[(product, rng.randint(1, 3)) for product in rng.sample(catalogue, rng.randint(1, 5))] for _ in range(1_000)]
+    ids = OrderIdGenerator(shard_id=0)
+    directory = tempfile.mkdtemp(prefix="order-log-")
+    try:
+        log = OrderLog(directory)
+        start = time.perf_counter()
+        for i in range(orders):
+            log.append(ids.next_id(), rng.randrange(customers), carts[i % len(carts)])
+        log.flush()
+        elapsed = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        log.close()
+        print(f"append:  {orders / elapsed:>10,.0f} orders/s, {size / orders:.1f} bytes/order on disk")
+
+        start = time.perf_counter()
+        log = OrderLog(directory)
+        print(f"replay:  {(time.perf_counter() - start) * 1e3:>10,.0f} ms to reopen and index {log.count:,} orders")
+        log.close()
+        os.remove(os.path.join(directory, "index.snapshot"))
+        start = time.perf_counter()
+        log = OrderLog(directory)
+        print(f"         {(time.perf_counter() - start) * 1e3:>10,.0f} ms without the index snapshot (after a crash)")
+
+        histogram = LatencyHistogram()
+        for _ in range(queries):
+            start = time.perf_counter()
+            log.orders_for(rng.randrange(customers), limit=10)
+            histogram.record(time.perf_counter() - start)
+        summary = histogram.summary()
+        print(f"query:   p50 {summary['p50_ms'] * 1e3:.0f} us, p99 {summary['p99_ms'] * 1e3:.0f} us (last 10 orders)")
+        log.close()
+    finally:
+        shutil.rmtree(directory)
+
+    tracemalloc.start()
+    in_memory = defaultdict(list)
+    for i in range(orders // 10):
+        in_memory[rng.randrange(customers)].append([(product, quantity) for product, quantity in carts[i % len(carts)]])
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"in-memory orders dict: {used / (orders // 10):.1f} bytes/order of RAM")
+
+# Prices order items by testing every promotion against every line: the baseline for the
+# pricing benchmark, following the same rules as PromotionEngine
+def price_naively(order_items: list, promotions: list) -> int:
+    subtotal = 0
+    for product, quantity in order_items:
+        percent_off = max((promotion.percent_off for promotion in promotions
+                           if isinstance(promotion, LinePromotion) and promotion.applies_to(product, quantity)), default=0.0)
+        gross = to_cents(product.price) * quantity
+        subtotal += gross - round(gross * percent_off / 100)
+    discount = max((to_cents(promotion.amount_off) for promotion in promotions
+                    if isinstance(promotion, CartPromotion) and to_cents(promotion.min_subtotal) <= subtotal), default=0)
+    return subtotal - min(discount, subtotal)
+
+# Checkout pricing of large carts: every rule against every line, the indexed engine from
+# scratch, and the incrementally maintained cart price after a few price changes
+def benchmark_cart_pricing(carts: int = 20, lines: int = 500, products: int = 20_000, categories: int = 200,
+                           product_rules: int = 5_000, price_changes: int = 5, seed: int = 15):
+    rng = random.Random(seed)
+    platform = AmazonEcommercePlatform()
+    catalogue = [Product(f"product-{i}", round(rng.uniform(1, 300), 2), 1_000, category=f"category-{i % categories}")
+                 for i in range(products)]
+    with logger.disabled():
+        for product in catalogue:
+            platform.add_product_to_inventory(product)
+    promotions = [LinePromotion(f"product-{i}", rng.choice((5, 10, 15, 20)), product_name=product.name,
+                                min_quantity=rng.randint(1, 3)) for i, product in enumerate(rng.sample(catalogue, product_rules))]
+    # Product rules restricted to a category; half name some other product's category, which
+    # the product is almost never in
+    promotions += [LinePromotion(f"product-category-{i}", 25, product_name=product.name,
+                                 category=product.category if i % 2 else rng.choice(catalogue).category)
+                   for i, product in enumerate(rng.sample(catalogue, product_rules // 10))]
+    promotions += [LinePromotion(f"category-{i}", rng.choice((5, 10)), category=f"category-{i}") for i in range(categories)]
+    promotions += [LinePromotion(f"bulk-{i}", 10 + i, min_quantity=3 + i) for i in range(20)]
+    promotions += [CartPromotion(f"cart-{i}", 5 * (i + 1), 100 * (i + 1)) for i in range(50)]
+    for promotion in promotions:
+        platform.promotions.add_promotion(promotion)
+
+    customers = []
+    edit_start = time.perf_counter()
+    with logger.disabled():
+        for i in range(carts):
+            customer = Customer(i, f"customer-{i}", "Credit Card")
+            platform.enable_cart_pricing(customer)
+            for product in rng.sample(catalogue, lines):
+                customer.add_to_cart(product, rng.randint(1, 4))
+            customers.append(customer)
+    edit_time = (time.perf_counter() - edit_start) / (carts * lines)
+
+    with logger.disabled():
+        for product in rng.sample(catalogue, price_changes):
+            platform.inventory.update_price(product.name, round(product.price * 0.9, 2))
+    platform.inventory.events.flush()
+
+    timings = {"every rule x every line": 0.0, "indexed, from scratch": 0.0, "incremental": 0.0}
+    for customer in customers:
+        order_items = list(customer.cart.items())
+        start = time.perf_counter()
+        naive = price_naively(order_items, promotions)
+        indexed_start = time.perf_counter()
+        indexed = platform.promotions.total_cents(order_items)
+        incremental_start = time.perf_counter()
+        incremental = customer.pricing.total_cents()
+        end = time.perf_counter()
+        assert naive == indexed == incremental, (naive, indexed, incremental)
+        timings["every rule x every line"] += indexed_start - start
+        timings["indexed, from scratch"] += incremental_start - indexed_start
+        timings["incremental"] += end - incremental_start
+
+    print(f"{lines}-line carts, {len(promotions)} promotions, {price_changes} price changes before checkout")
+    print(f"cart edit (add_to_cart): {edit_time * 1e6:.1f} us")
+    for name, elapsed in timings.items():
+        print(f"checkout pricing, {name:<24} {elapsed / carts * 1e3:>9.3f} ms/cart")
+
+# Cost of inventory change events with many customers: every customer attached to the
+# inventory (the old Subject fan-out) versus subscriptions per product on the event bus
+def benchmark_inventory_fanout(customers: int = 100_000, products: int = 10_000, cart_lines: int = 3,
+                               removals: int = 100, seed: int = 16):
+    import gc
+
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(products)]
+
+    def setup(use_bus: bool):
+        platform = AmazonEcommercePlatform()
+        catalogue = [Product(f"product-{i}", 10.0, 100) for i in range(products)]
+        with logger.disabled():
+            for product in catalogue:
+                platform.add_product_to_inventory(product)
+            shoppers = []
+            for i in range(customers):
+                customer = Customer(i, f"customer-{i}", "Credit Card")
+                if use_bus:
+                    platform.register_customer(customer)
+                else:
+                    platform.inventory.attach(customer)
+                for product in rng.choices(catalogue, weights, k=cart_lines):
+                    customer.add_to_cart(product, 1)
+                shoppers.append(customer)
+        return platform, catalogue, shoppers
+
+    def remove_products(platform: AmazonEcommercePlatform, catalogue: list) -> tuple:
+        publish = 0.0
+        start = time.perf_counter()
+        with logger.disabled():
+            for product in catalogue[:removals]:
+                call_start = time.perf_counter()
+                platform.remove_product_from_inventory(product)
+                publish += time.perf_counter() - call_start
+            platform.inventory.events.flush()
+        return publish / removals, time.perf_counter() - start
+
+    platform, catalogue, shoppers = setup(use_bus=False)
+    publish, total = remove_products(platform, catalogue)
+    left = sum(len(customer.cart) for customer in shoppers)
+    print(f"attached observers: {publish * 1e3:>8.3f} ms per removal, {total * 1e3:>8.1f} ms total, "
+          f"{removals * customers:,} update calls")
+    del platform, catalogue, shoppers
+    gc.collect()
+
+    rng.seed(seed)
+    platform, catalogue, shoppers = setup(use_bus=True)
+    events = platform.inventory.events
+    publish, total = remove_products(platform, catalogue)
+    assert sum(len(customer.cart) for customer in shoppers) == left
+    print(f"event bus:          {publish * 1e3:>8.3f} ms per removal, {total * 1e3:>8.1f} ms total including delivery, "
+          f"{events.delivered:,} update calls in {events.batches} batches")
+
+    subscriptions = sum(len(subscribers) for subscribers in events.topics.values())
+    del shoppers[::2]
+    gc.collect()
+    remaining = sum(len(subscribers) for subscribers in events.topics.values())
+    print(f"weak subscriptions: {subscriptions:,} before dropping half the customers, {remaining:,} after")
+    events.close()
+
+# Checkout throughput (three add_to_cart calls and one checkout per order, five log records)
+# with the logger writing inline like the old print calls, on its background writer as text
+# or JSON, with INFO disabled, and with logging off
+def benchmark_logging(orders: int = 20_000, seed: int = 18):
+    settings = [
+        ("inline text (like print)", dict(level=EventLogger.INFO, background=False, structured=False)),
+        ("background text", dict(level=EventLogger.INFO, background=True, structured=False)),
+        ("background JSON", dict(level=EventLogger.INFO, background=True, structured=True)),
+        ("WARNING and up", dict(level=EventLogger.WARNING, background=True, structured=False)),
+        ("off", dict(level=EventLogger.OFF, background=True, structured=False)),
+    ]
+    previous = dict(level=logger.level, stream=logger.stream, structured=logger.structured, background=logger.background)
+    with open(os.devnull, "w") as devnull:
+        for name, setting in settings:
+            rng = random.Random(seed)
+            with logger.disabled():
+                platform = AmazonEcommercePlatform()
+                platform.payment_gateway = ApprovingPaymentGateway()
+                catalogue = [Product(f"product-{i}", 10.0, orders * 3) for i in range(100)]
+                for product in catalogue:
+                    platform.add_product_to_inventory(product)
+            customer = Customer(1, "Benchmark", "Credit Card")
+            logger.configure(stream=devnull, **setting)
+            start = time.perf_counter()
+            for _ in range(orders):
+                for product in rng.sample(catalogue, 3):
+                    customer.add_to_cart(product, 1)
+                customer.checkout(platform)
+            logged = time.perf_counter() - start
+            logger.flush()
+            written = time.perf_counter() - start
+            print(f"{name:<26} {orders / logged:>8.0f} checkouts/s ({written * 1e3:.0f} ms until all records were written)")
+    logger.configure(**previous)
+
+# Load test settings: a synthetic catalogue with Zipfian product popularity, customers whose
+# carts are filled and checked out at random, and the number of workers (threads sharing one
+# platform, or processes with a platform each) driving operations per worker
+class LoadTestConfig:
+    def __init__(self, products: int = 10_000, customers: int = 1_000, operations: int = 20_000, workers: int = 4,
+                 mode: str = "threads", zipf_exponent: float = 1.1, max_cart_lines: int = 5,
+                 checkout_probability: float = 0.2, seed: int = 17):
+        if mode not in ("threads", "processes"):
+            raise ValueError("mode must be 'threads' or 'processes'")
+        if mode == "processes" and workers > OrderIdGenerator.MAX_SHARD + 1:
+            raise ValueError(f"at most {OrderIdGenerator.MAX_SHARD + 1} process workers, one per order ID shard")
+        self.products = products
+        self.customers = customers  # Per worker
+        self.operations = operations  # Per worker
+        self.workers = workers
+        self.mode = mode
+        self.zipf_exponent = zipf_exponent
+        self.max_cart_lines = max_cart_lines
+        self.checkout_probability = checkout_probability
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+# Platform with the synthetic catalogue; payments always succeed and stock never runs out, so
+# the load test measures the platform rather than the simulated failures. Each process worker
+# builds its own platform on its own ID shard.
+def build_load_platform(config: LoadTestConfig, shard_id: int = None) -> AmazonEcommercePlatform:
+    rng = random.Random(config.seed)
+    platform = AmazonEcommercePlatform(shard_id)
+    platform.payment_gateway = ApprovingPaymentGateway()
+    with logger.disabled():
+        for i in range(config.products):
+            platform.add_product_to_inventory(Product(f"product-{i}", round(rng.uniform(1, 500), 2), 10 ** 12,
+                                                      category=f"category-{i % 100}"))
+    return platform
+
+# Runs one worker's share of the load; returns a LatencyHistogram per operation and the time
+# spent driving operations. Process workers build their own platform from the config.
+def run_load_worker(config: LoadTestConfig, worker: int, platform: AmazonEcommercePlatform = None) -> tuple:
+    in_process = platform is None
+    if in_process:
+        platform = build_load_platform(config, shard_id=worker)
+    rng = random.Random(config.seed * 1_000 + worker)
+    catalogue = list(platform.inventory.products.values())
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) ** config.zipf_exponent for rank in range(len(catalogue))))
+    customers = []
+    for i in range(config.customers):
+        customer = Customer(worker * config.customers + i, f"load-customer-{worker}-{i}", "Credit Card")
+        platform.register_customer(customer)
+        customers.append(customer)
+
+    histograms = {"add_to_cart": LatencyHistogram(), "checkout": LatencyHistogram()}
+    started = time.perf_counter()
+    with logger.disabled() if in_process else contextlib.nullcontext():
+        for _ in range(config.operations):
+            customer = rng.choice(customers)
+            if customer.cart and (len(customer.cart) >= config.max_cart_lines or rng.random() < config.checkout_probability):
+                start = time.perf_counter()
+                customer.checkout(platform)
+                histograms["checkout"].record(time.perf_counter() - start)
+            else:
+                product = rng.choices(catalogue, cum_weights=cum_weights)[0]
+                start = time.perf_counter()
+                customer.add_to_cart(product, rng.randint(1, 3))
+                histograms["add_to_cart"].record(time.perf_counter() - start)
+    return histograms, time.perf_counter() - started
+
+# Drives the configured load and returns the results as a JSON-serialisable dict: the config,
+# the measured time (the slowest worker's, excluding set-up), and count, throughput and
+# latency percentiles per operation
+def run_load_test(config: LoadTestConfig) -> dict:
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    if config.mode == "processes":
+        with ProcessPoolExecutor(config.workers) as pool:
+            results = list(pool.map(run_load_worker, [config] * config.workers, range(config.workers)))
+    else:
+        platform = build_load_platform(config)
+        with logger.disabled(), ThreadPoolExecutor(config.workers) as pool:
+            results = list(pool.map(run_load_worker, [config] * config.workers, range(config.workers),
+                                    [platform] * config.workers))
+    elapsed = max(worker_elapsed for _, worker_elapsed in results)
+
+    operations = {}
+    for name in results[0][0]:
+        histogram = LatencyHistogram()
+        for worker_histograms, _ in results:
+            histogram.merge(worker_histograms[name])
+        summary = histogram.summary()
+        summary["throughput_per_s"] = histogram.count / elapsed
+        operations[name] = summary
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "config": config.to_dict(),
+        "elapsed_s": elapsed,
+        "operations": operations,
+    }
+
+# Regressions of current against baseline: throughput down or p99 up by more than tolerance
+def compare_load_results(current: dict, baseline: dict, tolerance: float = 0.10) -> list:
+    regressions = []
+    for name, summary in current["operations"].items():
+        before = baseline["operations"].get(name)
+        if before is None:
+            continue
+        if summary["throughput_per_s"] < before["throughput_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput_per_s']:.0f}/s -> {summary['throughput_per_s']:.0f}/s")
+        if summary["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {before['p99_ms']:.3f} ms -> {summary['p99_ms']:.3f} ms")
+    return regressions
+
+def print_load_results(results: dict):
+    config = results["config"]
+    print(f"{config['workers']} {config['mode']}, {config['products']} products, {config['operations']} operations per worker, "
+          f"{results['elapsed_s']:.2f} s")
+    print(f"{'operation':>12} {'count':>8} {'ops/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8} {'max ms':>8}")
+    for name, summary in results["operations"].items():
+        print(f"{name:>12} {summary['count']:>8} {summary['throughput_per_s']:>9.0f} {summary['p50_ms']:>8.3f} "
+              f"{summary['p99_ms']:>8.3f} {summary['p999_ms']:>8.3f} {summary['max_ms']:>8.3f}")
+
+# Small load test with threads and with processes; use the load command for full runs
+def benchmark_load():
+    for mode in ("threads", "processes"):
+        print_load_results(run_load_test(LoadTestConfig(operations=10_000, mode=mode)))
+
+# Benchmarks: python "Amazon E Commerce Code.py" benchmark [name ...]; sizes can be raised to
+# 10M products by calling the functions directly
+BENCHMARKS = {
+    "inventory_lookup": benchmark_inventory_lookup,
+    "concurrent_checkout": benchmark_concurrent_checkout,
+    "payment_resilience": benchmark_payment_resilience,
+    "flash_sale": benchmark_flash_sale,
+    "order_ids": benchmark_order_ids,
+    "order_log": benchmark_order_log,
+    "cart_pricing": benchmark_cart_pricing,
+    "inventory_fanout": benchmark_inventory_fanout,
+    "load": benchmark_load,
+    "logging": benchmark_logging,
+}
+
+if __name__ == "__main__" and sys.argv[1:2] == ["benchmark"]:
+    for name in sys.argv[2:] or BENCHMARKS:
+        BENCHMARKS[name]()
+    sys.exit(0)
+
+# Load test: python "Amazon E Commerce Code.py" load [options]; --output saves the results as
+# JSON and --baseline compares against a saved run, exiting with status 1 on a regression
+if __name__ == "__main__" and sys.argv[1:2] == ["load"]:
+    import argparse
+
+    defaults = LoadTestConfig()
+    parser = argparse.ArgumentParser(prog="load")
+    for name, value in defaults.to_dict().items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    arguments = vars(parser.parse_args(sys.argv[2:]))
+    output, baseline, tolerance = arguments.pop("output"), arguments.pop("baseline"), arguments.pop("tolerance")
+    results = run_load_test(LoadTestConfig(**arguments))
+    print_load_results(results)
+    if output:
+        with open(output, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+    if baseline:
+        with open(baseline) as baseline_file:
+            regressions = compare_load_results(results, json.load(baseline_file), tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+    sys.exit(0)
 
 # Example usage
 if __name__ == "__main__":
@@ -1,6 +1,20 @@
+from array import array
+from collections import OrderedDict, deque
 from enum import Enum
+import asyncio
+import heapq
+import inspect
+import itertools
 import random
 import math
+import sys
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # batch assignment falls back to the per-customer loop
+    np = None
 
 # Enum for package sizes
 class PackageSize(Enum):
@@ -8,14 +22,111 @@ class PackageSize(Enum):
     MEDIUM = 2
     LARGE = 3
 
-# Locker class representing individual lockers
+# Columnar store for locker state: one slot per locker across compact arrays instead of one
+# Python object per locker. Observers are kept only for lockers that have any. Each
+# AmazonLockerSystem owns one (system.store) for the lockers of its locations; a detached
+# store holds a single locker created without a store until a Location adopts it.
+class LockerStore:
+    def __init__(self, detached: bool = False):
+        self.detached = detached
+        self.locker_ids = array('q')
+        self.sizes = array('b')  # PackageSize value
+        self.assigned = bytearray()
+        self.pins = array('i')  # 0 means no PIN
+        self.expires_at = array('d')  # pickup deadline on the system clock, 0.0 when free
+        self.location_slots = array('i')  # index into self.locations, -1 when not placed
+        self.locations = []
+        self.observers = {}  # slot -> set of observers
+        self.dispatcher = None  # NotificationDispatcher; None notifies observers synchronously
+        self.lock = threading.Lock()  # keeps the columns aligned while slots are appended
+
+    def __len__(self):
+        return len(self.locker_ids)
+
+    def append(self, locker_id: int, size: PackageSize) -> int:
+        with self.lock:
+            self.locker_ids.append(locker_id)
+            self.sizes.append(size.value)
+            self.assigned.append(0)
+            self.pins.append(0)
+            self.expires_at.append(0.0)
+            self.location_slots.append(-1)
+            return len(self.locker_ids) - 1
+
+    # Moves a locker out of its detached store into this one and repoints the view
+    def adopt(self, locker: 'Locker'):
+        source, slot = locker.store, locker.index
+        index = self.append(source.locker_ids[slot], PACKAGE_SIZES[source.sizes[slot]])
+        self.assigned[index] = source.assigned[slot]
+        self.pins[index] = source.pins[slot]
+        self.expires_at[index] = source.expires_at[slot]
+        if slot in source.observers:
+            self.observers[index] = source.observers.pop(slot)
+        locker.store, locker.index = self, index
+
+    def register_location(self, location) -> int:
+        with self.lock:
+            self.locations.append(location)
+            return len(self.locations) - 1
+
+    def nbytes(self) -> int:
+        columns = (self.locker_ids, self.sizes, self.pins, self.expires_at, self.location_slots)
+        return sum(column.itemsize * len(column) for column in columns) + len(self.assigned)
+
+PACKAGE_SIZES = {size.value: size for size in PackageSize}
+
+# Locker class representing individual lockers: a thin view over one LockerStore slot.
+# Views are cheap to create and compare equal when they point at the same slot. A locker
+# created without a store starts in a detached store of its own and moves into the store
+# of the Location it is given to.
 class Locker:
-    def __init__(self, locker_id: int, size: PackageSize):
-        self.locker_id = locker_id
-        self.size = size
-        self.is_assigned = False
-        self.pin = None
-        self.observers = set()
+    __slots__ = ("store", "index")
+
+    def __init__(self, locker_id: int, size: PackageSize, store: LockerStore = None):
+        self.store = store if store is not None else LockerStore(detached=True)
+        self.index = self.store.append(locker_id, size)
+
+    @classmethod
+    def view(cls, store: LockerStore, index: int):
+        locker = cls.__new__(cls)
+        locker.store = store
+        locker.index = index
+        return locker
+
+    def __eq__(self, other):
+        return isinstance(other, Locker) and self.store is other.store and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.store), self.index))
+
+    @property
+    def locker_id(self) -> int:
+        return self.store.locker_ids[self.index]
+
+    @property
+    def size(self) -> PackageSize:
+        return PACKAGE_SIZES[self.store.sizes[self.index]]
+
+    @property
+    def is_assigned(self) -> bool:
+        return self.store.assigned[self.index] == 1
+
+    @is_assigned.setter
+    def is_assigned(self, value: bool):
+        self.store.assigned[self.index] = 1 if value else 0
+
+    @property
+    def pin(self):
+        return self.store.pins[self.index] or None
+
+    @pin.setter
+    def pin(self, value):
+        self.store.pins[self.index] = value or 0
+
+    @property
+    def location(self):
+        slot = self.store.location_slots[self.index]
+        return self.store.locations[slot] if slot >= 0 else None
 
     def assign(self, pin: int):
         self.is_assigned = True
@@ -23,18 +134,29 @@ class Locker:
         self.notify_observers()
 
     def free(self):
-        self.is_assigned = False
-        self.pin = None
+        location = self.location
+        if location is not None:
+            location.release_locker(self)
+        elif self.is_assigned:
+            self.is_assigned = False
+            self.pin = None
 
     def add_observer(self, observer):
-        self.observers.add(observer)
+        self.store.observers.setdefault(self.index, set()).add(observer)
 
     def remove_observer(self, observer):
-        self.observers.remove(observer)
+        observers = self.store.observers[self.index]
+        observers.remove(observer)
+        if not observers:
+            del self.store.observers[self.index]
 
     def notify_observers(self):
-        for observer in self.observers:
-            observer.update(self.locker_id, self.pin)
+        dispatcher = self.store.dispatcher
+        for observer in list(self.store.observers.get(self.index, ())):
+            if dispatcher is None:
+                observer.update(self.locker_id, self.pin)
+            else:
+                dispatcher.submit(observer, self.locker_id, self.pin)
 
     def check_pin(self, pin: int) -> bool:
         return self.is_assigned and self.pin == pin
@@ -48,19 +170,28 @@ class Customer:
         self.assigned_locker = None
         self.pin = None
 
-    # Observer method to receive notification when locker is assigned
+    # Observer method to receive notification when locker is assigned. The system has already
+    # set assigned_locker and pin; notifications may arrive later from another thread.
     def update(self, locker_id: int, pin: int):
-        self.assigned_locker = locker_id
-        self.pin = pin
         print(f"Customer {self.customer_id}: Assigned locker ID - {locker_id}, PIN - {pin}")
 
     # Method to order a package and assign locker
     def order_package(self, package: PackageSize, amazon_locker_system):
         amazon_locker_system.assign_locker(self, package)
 
+    # A locker at a location is released by the location, which checks the PIN and frees it
+    # under its lock, so a locker that expired and went to someone else in between is left alone
     def unassign_locker(self, pin: int) -> bool:
-        if self.assigned_locker and self.assigned_locker.check_pin(pin):
-            self.assigned_locker.free()
+        locker = self.assigned_locker
+        location = locker.location if locker is not None else None
+        if location is not None:
+            released = pin is not None and location.release_locker(locker, expected_pin=pin)
+        else:
+            released = locker is not None and locker.check_pin(pin)
+            if released:
+                locker.remove_observer(self)
+                locker.free()
+        if released:
             self.assigned_locker = None
             self.pin = None
             print(f"Customer {self.customer_id}: Locker unassigned successfully")
@@ -69,32 +200,503 @@ class Customer:
             print(f"Customer {self.customer_id}: Invalid PIN or no assigned locker")
             return False
 
+# Delivers observer notifications off the assignment path. Events go onto a bounded asyncio
+# queue served by an event loop on a background thread, which drains it in batches; observers
+# whose update() returns an awaitable are awaited concurrently within a batch. submit() blocks
+# while max_pending events are undelivered, so slow observers push back on producers instead
+# of growing memory without bound.
+class NotificationDispatcher:
+    def __init__(self, max_pending: int = 10_000, batch_size: int = 256, latency_samples: int = 10_000):
+        self.batch_size = batch_size
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.pending = 0
+        self.delivered = 0
+        self.failed = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=latency_samples)  # seconds from submit to delivery
+        self.idle = threading.Condition()
+        self.loop = asyncio.new_event_loop()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, name="locker-notifications", daemon=True)
+        self.thread.start()
+
+    def submit(self, observer, locker_id: int, pin: int):
+        self.slots.acquire()
+        with self.idle:
+            self.pending += 1
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (time.perf_counter(), observer, locker_id, pin))
+
+    # Blocks until every submitted event has been delivered
+    def flush(self, timeout: float = None) -> bool:
+        with self.idle:
+            return self.idle.wait_for(lambda: self.pending == 0, timeout)
+
+    def close(self):
+        self.flush()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def metrics(self) -> dict:
+        samples = sorted(self.latencies)
+
+        def percentile(q: float) -> float:
+            return samples[min(len(samples) - 1, int(q * len(samples)))] * 1e3 if samples else 0.0
+
+        return {
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "batches": self.batches,
+            "mean_batch": self.delivered / self.batches if self.batches else 0.0,
+            "p50_ms": percentile(0.50),
+            "p99_ms": percentile(0.99),
+            "max_ms": samples[-1] * 1e3 if samples else 0.0,
+        }
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        consumer = self.loop.create_task(self._consume())
+        self.loop.run_forever()
+        consumer.cancel()
+        self.loop.run_until_complete(asyncio.gather(consumer, return_exceptions=True))
+        self.loop.close()
+
+    async def _consume(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self._deliver(batch)
+
+    async def _deliver(self, batch: list):
+        failed = 0
+        awaiting = []
+        for submitted, observer, locker_id, pin in batch:
+            try:
+                result = observer.update(locker_id, pin)
+            except Exception:
+                failed += 1
+                continue
+            if inspect.isawaitable(result):
+                awaiting.append(result)
+        if awaiting:
+            failed += sum(isinstance(outcome, Exception)
+                          for outcome in await asyncio.gather(*awaiting, return_exceptions=True))
+        delivered_at = time.perf_counter()
+        self.latencies.extend(delivered_at - submitted for submitted, _, _, _ in batch)
+        with self.idle:
+            self.pending -= len(batch)
+            self.delivered += len(batch) - failed
+            self.failed += failed
+            self.batches += 1
+            if self.pending == 0:
+                self.idle.notify_all()
+        for _ in batch:
+            self.slots.release()
+
 # Strategy Interface for distance calculation
 class DistanceCalculationStrategy:
     def calculate_distance(self, loc1_latitude: float, loc1_longitude: float, loc2_latitude: float, loc2_longitude: float) -> float:
         pass
 
+    # Distances from every customer (rows) to every location (columns) as a NumPy matrix;
+    # strategies override this with a vectorized version
+    def calculate_distances(self, loc_latitudes, loc_longitudes, customer_latitudes, customer_longitudes):
+        return np.array([[self.calculate_distance(loc_lat, loc_lon, cust_lat, cust_lon)
+                          for loc_lat, loc_lon in zip(loc_latitudes.tolist(), loc_longitudes.tolist())]
+                         for cust_lat, cust_lon in zip(customer_latitudes.tolist(), customer_longitudes.tolist())],
+                        dtype=float).reshape(len(customer_latitudes), len(loc_latitudes))
+
 # Concrete Strategy for Euclidean distance calculation
 class EuclideanDistanceStrategy(DistanceCalculationStrategy):
+    # Squares are taken as d * d rather than d ** 2: libm pow can differ from the
+    # product in the last bit, and NumPy squares by multiplying
+    def calculate_distance(self, loc1_latitude: float, loc1_longitude: float, loc2_latitude: float, loc2_longitude: float) -> float:
+        d_lat = loc1_latitude - loc2_latitude
+        d_lon = loc1_longitude - loc2_longitude
+        return math.sqrt(d_lat * d_lat + d_lon * d_lon)
+
+    def calculate_distances(self, loc_latitudes, loc_longitudes, customer_latitudes, customer_longitudes):
+        d_lat = loc_latitudes[None, :] - customer_latitudes[:, None]
+        d_lon = loc_longitudes[None, :] - customer_longitudes[:, None]
+        return np.sqrt(d_lat * d_lat + d_lon * d_lon)
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Concrete Strategy for great-circle distance in kilometres
+class HaversineDistanceStrategy(DistanceCalculationStrategy):
     def calculate_distance(self, loc1_latitude: float, loc1_longitude: float, loc2_latitude: float, loc2_longitude: float) -> float:
-        return math.sqrt((loc1_latitude - loc2_latitude) ** 2 + (loc1_longitude - loc2_longitude) ** 2)
+        phi1, phi2 = math.radians(loc1_latitude), math.radians(loc2_latitude)
+        a = (math.sin((phi1 - phi2) / 2) ** 2
+             + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(loc1_longitude - loc2_longitude) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+    def calculate_distances(self, loc_latitudes, loc_longitudes, customer_latitudes, customer_longitudes):
+        phi_loc = np.radians(loc_latitudes)[None, :]
+        phi_customer = np.radians(customer_latitudes)[:, None]
+        d_lambda = np.radians(loc_longitudes)[None, :] - np.radians(customer_longitudes)[:, None]
+        a = np.sin((phi_loc - phi_customer) / 2) ** 2 + np.cos(phi_loc) * np.cos(phi_customer) * np.sin(d_lambda / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+# Concrete Strategy backed by a precomputed (e.g. road) distance matrix between origin points
+# and locker locations. Customers are snapped to their nearest origin; locations missing from
+# the matrix are measured with the fallback strategy.
+class DistanceMatrixStrategy(DistanceCalculationStrategy):
+    def __init__(self, origin_latitudes, origin_longitudes, location_latitudes, location_longitudes,
+                 distances, fallback: DistanceCalculationStrategy = None):
+        self.origin_latitudes = np.asarray(origin_latitudes, dtype=float)
+        self.origin_longitudes = np.asarray(origin_longitudes, dtype=float)
+        self.columns = {point: column for column, point in
+                        enumerate(zip(np.asarray(location_latitudes, dtype=float).tolist(),
+                                      np.asarray(location_longitudes, dtype=float).tolist()))}
+        self.distances = np.asarray(distances, dtype=float)
+        self.fallback = fallback or HaversineDistanceStrategy()
+        self._column_lookup = (None, None)  # (location array, matrix columns) from the last call
+
+    # Load a matrix saved with np.savez(path, origin_latitudes=..., origin_longitudes=...,
+    # location_latitudes=..., location_longitudes=..., distances=...)
+    @classmethod
+    def from_file(cls, path: str, fallback: DistanceCalculationStrategy = None):
+        with np.load(path) as data:
+            return cls(data["origin_latitudes"], data["origin_longitudes"], data["location_latitudes"],
+                       data["location_longitudes"], data["distances"], fallback)
+
+    def calculate_distance(self, loc1_latitude: float, loc1_longitude: float, loc2_latitude: float, loc2_longitude: float) -> float:
+        column = self.columns.get((loc1_latitude, loc1_longitude))
+        if column is None:
+            return self.fallback.calculate_distance(loc1_latitude, loc1_longitude, loc2_latitude, loc2_longitude)
+        origin = self._snap(np.array([loc2_latitude]), np.array([loc2_longitude]))[0]
+        return float(self.distances[origin, column])
+
+    def calculate_distances(self, loc_latitudes, loc_longitudes, customer_latitudes, customer_longitudes):
+        if self._column_lookup[0] is not loc_latitudes:
+            columns = np.array([self.columns.get(point, -1) for point in
+                                zip(loc_latitudes.tolist(), loc_longitudes.tolist())], dtype=np.int64)
+            self._column_lookup = (loc_latitudes, columns)
+        columns = self._column_lookup[1]
+        origins = self._snap(customer_latitudes, customer_longitudes)
+        result = self.distances[origins[:, None], np.maximum(columns, 0)[None, :]]
+        missing = columns < 0
+        if missing.any():
+            result[:, missing] = self.fallback.calculate_distances(loc_latitudes[missing], loc_longitudes[missing],
+                                                                   customer_latitudes, customer_longitudes)
+        return result
+
+    def _snap(self, customer_latitudes, customer_longitudes):
+        return np.argmin(self.fallback.calculate_distances(self.origin_latitudes, self.origin_longitudes,
+                                                           customer_latitudes, customer_longitudes), axis=1)
+
+# Decorator Strategy that caches distance rows per quantized customer coordinate with LRU eviction.
+# Customers are measured from their rounded coordinates, so everyone in the same cell (about 110 m
+# at the default precision of 3 decimals) shares one row. Rows are dropped when the location set
+# changes, which callers signal by passing a different location array.
+class CachedDistanceStrategy(DistanceCalculationStrategy):
+    def __init__(self, strategy: DistanceCalculationStrategy, precision: int = 3, maxsize: int = 1024):
+        self.strategy = strategy
+        self.precision = precision
+        self.maxsize = maxsize
+        self.rows = OrderedDict()
+        self.locations = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # guards rows and counters; rows are computed outside it
+
+    def quantize(self, latitude: float, longitude: float):
+        return round(latitude, self.precision), round(longitude, self.precision)
+
+    def calculate_distance(self, loc1_latitude: float, loc1_longitude: float, loc2_latitude: float, loc2_longitude: float) -> float:
+        latitude, longitude = self.quantize(loc2_latitude, loc2_longitude)
+        return self.strategy.calculate_distance(loc1_latitude, loc1_longitude, latitude, longitude)
+
+    def calculate_distances(self, loc_latitudes, loc_longitudes, customer_latitudes, customer_longitudes):
+        keys = [self.quantize(latitude, longitude)
+                for latitude, longitude in zip(customer_latitudes.tolist(), customer_longitudes.tolist())]
+        result = np.empty((len(keys), len(loc_latitudes)))
+        missing = {}
+        with self.lock:
+            if self.locations is not loc_latitudes:
+                self.rows.clear()
+                self.locations = loc_latitudes
+            for i, key in enumerate(keys):
+                row = self.rows.get(key)
+                if row is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self.rows.move_to_end(key)
+                    result[i] = row
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+        if not missing:
+            return result
+
+        computed = self.strategy.calculate_distances(loc_latitudes, loc_longitudes,
+                                                     np.array([key[0] for key in missing], dtype=float),
+                                                     np.array([key[1] for key in missing], dtype=float))
+        for (key, indices), row in zip(missing.items(), computed):
+            result[indices] = row
+        with self.lock:
+            if self.locations is loc_latitudes:
+                for key, row in zip(missing, computed):
+                    self.rows[key] = row
+                while len(self.rows) > self.maxsize:
+                    self.rows.popitem(last=False)
+        return result
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+# Node of the k-d tree; each node holds one location and splits on latitude (axis 0) or longitude (axis 1)
+class KDNode:
+    __slots__ = ("location", "point", "seq", "axis", "left", "right", "size", "removed")
+
+    def __init__(self, location, seq: int):
+        self.location = location
+        self.point = (location.latitude, location.longitude)
+        self.seq = seq  # insertion order, used to break distance ties like the linear scan does
+        self.axis = 0
+        self.left = None
+        self.right = None
+        self.size = 1  # nodes in this subtree, removed ones included
+        self.removed = False
+
+# Spatial index over locations: a scapegoat k-d tree that stays balanced under inserts
+# and supports lazy removal, answering nearest-neighbour queries in O(log n).
+# Writers must be serialized by the caller; queries need no lock because new nodes are
+# linked in fully built and rebuilt subtrees are fresh nodes swapped in with one assignment.
+class KDTreeLocationIndex:
+    ALPHA = 0.7  # a subtree is rebuilt once one child holds more than ALPHA of its nodes
+
+    def __init__(self):
+        self.root = None
+        self.nodes = {}  # location -> live node
+        self.removed_count = 0
+        self.next_seq = 0
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def insert(self, location):
+        if location in self.nodes:
+            return
+        node = KDNode(location, self.next_seq)
+        self.next_seq += 1
+        self.nodes[location] = node
+        if self.root is None:
+            self.root = node
+            return
+
+        path = []
+        current = self.root
+        while current is not None:
+            current.size += 1
+            path.append(current)
+            if node.point[current.axis] < current.point[current.axis]:
+                current = current.left
+            else:
+                current = current.right
+        parent = path[-1]
+        node.axis = 1 - parent.axis
+        if node.point[parent.axis] < parent.point[parent.axis]:
+            parent.left = node
+        else:
+            parent.right = node
+
+        if len(path) > math.log(self.root.size) / math.log(1 / self.ALPHA):
+            self._rebalance(path, node)
+
+    def remove(self, location):
+        node = self.nodes.pop(location, None)
+        if node is None:
+            return
+        node.removed = True
+        self.removed_count += 1
+        if self.removed_count > len(self.nodes):
+            self.root = self._build(self._collect(self.root), 0)
+            self.removed_count = 0
+
+    # Method to find the closest location, breaking ties by insertion order
+    def nearest(self, latitude: float, longitude: float):
+        query = (latitude, longitude)
+        best = [float('inf'), -1, None]  # distance, seq, location
+
+        def visit(node):
+            if not node.removed:
+                d_lat = node.point[0] - latitude
+                d_lon = node.point[1] - longitude
+                distance = math.sqrt(d_lat * d_lat + d_lon * d_lon)
+                if distance < best[0] or (distance == best[0] and node.seq < best[1]):
+                    best[0], best[1], best[2] = distance, node.seq, node.location
+            diff = node.point[node.axis] - query[node.axis]
+            near, far = (node.left, node.right) if diff > 0 else (node.right, node.left)
+            if near is not None:
+                visit(near)
+            # Bound computed with the same rounding as a point distance so exact ties are never pruned
+            if far is not None and math.sqrt(diff * diff) <= best[0]:
+                visit(far)
+
+        if self.root is not None:
+            visit(self.root)
+        return best[2]
+
+    # Method to find the k closest locations ordered by distance, ties broken by insertion order
+    def k_nearest(self, latitude: float, longitude: float, k: int):
+        query = (latitude, longitude)
+        heap = []  # max-heap of the k best so far as (-distance, -seq, location)
+
+        def visit(node):
+            if not node.removed:
+                d_lat = node.point[0] - latitude
+                d_lon = node.point[1] - longitude
+                distance = math.sqrt(d_lat * d_lat + d_lon * d_lon)
+                entry = (-distance, -node.seq, node.location)
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+            diff = node.point[node.axis] - query[node.axis]
+            near, far = (node.left, node.right) if diff > 0 else (node.right, node.left)
+            if near is not None:
+                visit(near)
+            if far is not None and (len(heap) < k or math.sqrt(diff * diff) <= -heap[0][0]):
+                visit(far)
+
+        if self.root is not None and k > 0:
+            visit(self.root)
+        return [location for _, _, location in sorted(heap, reverse=True)]
+
+    def _rebalance(self, path, node):
+        child_size = node.size
+        for depth in range(len(path) - 1, -1, -1):
+            ancestor = path[depth]
+            if child_size > self.ALPHA * ancestor.size:
+                old_size = ancestor.size
+                rebuilt = self._build(self._collect(ancestor), ancestor.axis)
+                if depth == 0:
+                    self.root = rebuilt
+                elif path[depth - 1].left is ancestor:
+                    path[depth - 1].left = rebuilt
+                else:
+                    path[depth - 1].right = rebuilt
+                # Subtree sizes above the rebuilt node shrink by the removed nodes it dropped
+                dropped = old_size - (rebuilt.size if rebuilt else 0)
+                for above in path[:depth]:
+                    above.size -= dropped
+                self.removed_count -= dropped
+                return
+            child_size = ancestor.size
+
+    def _collect(self, root):
+        live = []
+        stack = [root] if root is not None else []
+        while stack:
+            node = stack.pop()
+            if not node.removed:
+                live.append(node)
+            if node.left is not None:
+                stack.append(node.left)
+            if node.right is not None:
+                stack.append(node.right)
+        return live
+
+    def _build(self, nodes, axis: int):
+        if not nodes:
+            return None
+        nodes.sort(key=lambda n: n.point[axis])
+        mid = len(nodes) // 2
+        node = KDNode(nodes[mid].location, nodes[mid].seq)
+        self.nodes[node.location] = node
+        node.axis = axis
+        node.left = self._build(nodes[:mid], 1 - axis)
+        node.right = self._build(nodes[mid + 1:], 1 - axis)
+        node.size = len(nodes)
+        return node
+
+# Min-heap of pickup deadlines. Entries are never removed early: a locker picked up (or
+# reassigned) before its deadline is skipped when its entry comes due because the locker's
+# stored deadline no longer matches.
+class LockerExpiryScheduler:
+    def __init__(self):
+        self.heap = []  # (deadline, seq, location, slot)
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def schedule(self, deadline: float, location, slot: int):
+        with self.lock:
+            heapq.heappush(self.heap, (deadline, next(self.seq), location, slot))
+
+    # Removes and returns every entry due at or before now, grouped by location
+    def pop_due(self, now: float) -> dict:
+        due = {}
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                deadline, _, location, slot = heapq.heappop(self.heap)
+                due.setdefault(location, []).append((slot, deadline))
+        return due
 
 # Amazon Locker Management System class using Singleton pattern
+# Locker assignment is safe to call from many threads: each Location guards its own free
+# lists, so threads only contend when they pick the same location. The locations lock is
+# taken only to change the set of locations.
 class AmazonLockerSystem:
     _instance = None
+    _instance_lock = threading.Lock()
 
     def __new__(cls, strategy: DistanceCalculationStrategy):
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance.locations = []
-            cls._instance.strategy = strategy
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    instance.locations = []
+                    instance.location_index = KDTreeLocationIndex()
+                    instance.strategy = strategy
+                    instance._coordinates = None
+                    instance._locations_lock = threading.Lock()
+                    instance.pickup_window = 72 * 3600  # seconds a package waits before the locker is reclaimed
+                    instance.clock = time.monotonic
+                    instance.expiry_scheduler = LockerExpiryScheduler()
+                    instance.store = LockerStore()  # State of the lockers created for this system
+                    cls._instance = instance
         return cls._instance
 
     def add_location(self, location):
-        self.locations.append(location)
+        with self._locations_lock:
+            self.locations.append(location)
+            self.location_index.insert(location)
+            self._coordinates = None
+
+    def remove_location(self, location):
+        with self._locations_lock:
+            self.locations.remove(location)
+            self.location_index.remove(location)
+            self._coordinates = None
 
-    # Method to find the closest location to the customer
+    # Snapshot of the locations with their coordinates as NumPy arrays, rebuilt only after the
+    # location set changes so vectorized strategies (and their caches) see the same arrays
+    def location_coordinates(self):
+        coordinates = self._coordinates
+        if coordinates is None:
+            with self._locations_lock:
+                if self._coordinates is None:
+                    locations = list(self.locations)
+                    self._coordinates = (locations,
+                                         np.array([location.latitude for location in locations], dtype=float),
+                                         np.array([location.longitude for location in locations], dtype=float))
+                coordinates = self._coordinates
+        return coordinates
+
+    # Method to find the closest location to the customer; the k-d tree answers
+    # Euclidean queries, any other strategy falls back to the linear scan
     def find_closest_location(self, customer_latitude: float, customer_longitude: float):
+        if type(self.strategy) is EuclideanDistanceStrategy:
+            return self.location_index.nearest(customer_latitude, customer_longitude)
+        nearest = self.find_nearest_locations(customer_latitude, customer_longitude, 1)
+        return nearest[0] if nearest else None
+
+    def find_closest_location_linear(self, customer_latitude: float, customer_longitude: float):
         closest_location = None
         min_distance = float('inf')
 
@@ -106,26 +708,508 @@ class AmazonLockerSystem:
 
         return closest_location
 
-    # Method to assign a locker to the customer for a given package
-    def assign_locker(self, customer, package_size: PackageSize) -> bool:
-        closest_location = self.find_closest_location(customer.latitude, customer.longitude)
-        if closest_location:
-            for locker in closest_location.lockers:
-                if not locker.is_assigned and locker.size == package_size:
-                    pin = random.randint(100000, 999999)
-                    locker.assign(pin)
-                    customer.assigned_locker = locker
-                    customer.pin = pin
-                    locker.add_observer(customer)
-                    return True
+    # Method to find the k closest locations to the customer, nearest first
+    def find_nearest_locations(self, customer_latitude: float, customer_longitude: float, k: int):
+        if type(self.strategy) is EuclideanDistanceStrategy:
+            return self.location_index.k_nearest(customer_latitude, customer_longitude, k)
+        if np is not None and self.locations and k > 0:
+            locations, loc_latitudes, loc_longitudes = self.location_coordinates()
+            distances = self.strategy.calculate_distances(loc_latitudes, loc_longitudes,
+                                                          np.array([customer_latitude]), np.array([customer_longitude]))
+            return [locations[i] for i in self._k_smallest(distances, min(k, len(locations)))[0].tolist()]
+        distances = ((self.strategy.calculate_distance(location.latitude, location.longitude, customer_latitude, customer_longitude), i, location)
+                     for i, location in enumerate(self.locations))
+        return [location for _, _, location in heapq.nsmallest(k, distances)]
+
+    # Method to assign a locker to the customer for a given package, falling back to
+    # the next closest of the k nearest locations when a location is full for that size
+    def assign_locker(self, customer, package_size: PackageSize, k: int = 3) -> bool:
+        locations = self.find_nearest_locations(customer.latitude, customer.longitude, k)
+        return self._assign_from_locations(customer, package_size, locations)
+
+    # Method to assign lockers to a batch of customers. Nearest locations for the whole batch
+    # are found with vectorized NumPy distance passes; lockers are then handed out in customer
+    # order, so the results match calling assign_locker for each customer in turn.
+    def assign_lockers_batch(self, customers: list, sizes: list, k: int = 3) -> list:
+        if len(customers) != len(sizes):
+            raise ValueError("customers and sizes must have the same length")
+        if np is None or k <= 0 or not self.locations:
+            return [self.assign_locker(customer, size, k) for customer, size in zip(customers, sizes)]
+
+        locations, loc_latitudes, loc_longitudes = self.location_coordinates()
+        customer_latitudes = np.array([customer.latitude for customer in customers], dtype=float)
+        customer_longitudes = np.array([customer.longitude for customer in customers], dtype=float)
+        if type(self.strategy) is EuclideanDistanceStrategy:
+            nearest = self._batch_nearest_grid(loc_latitudes, loc_longitudes, customer_latitudes, customer_longitudes, k)
+        else:
+            nearest = self._batch_nearest_scan(loc_latitudes, loc_longitudes, customer_latitudes, customer_longitudes, k)
+
+        results = []
+        for customer, size, indices in zip(customers, sizes, nearest):
+            if indices is None:
+                candidates = self.find_nearest_locations(customer.latitude, customer.longitude, k)
+            else:
+                candidates = [locations[i] for i in indices]
+            results.append(self._assign_from_locations(customer, size, candidates))
+        return results
+
+    # Nearest locations for every customer from the full customer x location distance matrix,
+    # computed in chunks to bound memory
+    def _batch_nearest_scan(self, loc_latitudes, loc_longitudes, customer_latitudes, customer_longitudes,
+                            k: int, chunk_elements: int = 4_000_000):
+        k = min(k, len(loc_latitudes))
+        rows = max(1, chunk_elements // len(loc_latitudes))
+        nearest = []
+        for start in range(0, len(customer_latitudes), rows):
+            distances = self.strategy.calculate_distances(loc_latitudes, loc_longitudes,
+                                                          customer_latitudes[start:start + rows],
+                                                          customer_longitudes[start:start + rows])
+            nearest.extend(self._k_smallest(distances, k).tolist())
+        return nearest
+
+    # Euclidean nearest locations using a uniform grid: customers are grouped by grid cell and each
+    # group is scored only against the locations in the surrounding 3x3 cells. A customer's answer
+    # is kept when its k-th distance is strictly below the distance to the nearest location outside
+    # that block; otherwise its entry is None and the caller falls back to the k-d tree.
+    def _batch_nearest_grid(self, loc_latitudes, loc_longitudes, customer_latitudes, customer_longitudes,
+                            k: int, locations_per_cell: int = 32):
+        n = max(1, int(math.sqrt(len(loc_latitudes) / locations_per_cell)))
+        lat_min, lon_min = loc_latitudes.min(), loc_longitudes.min()
+        lat_step = (loc_latitudes.max() - lat_min) / n or 1.0
+        lon_step = (loc_longitudes.max() - lon_min) / n or 1.0
+
+        def cells(latitudes, longitudes):
+            rows = np.clip(np.floor((latitudes - lat_min) / lat_step), 0, n - 1).astype(np.int64)
+            cols = np.clip(np.floor((longitudes - lon_min) / lon_step), 0, n - 1).astype(np.int64)
+            return rows, cols
+
+        # Bounds on the locations outside a block, taken from the actual coordinates in each
+        # row/column so rounding in the cell assignment cannot hide a closer location
+        loc_rows, loc_cols = cells(loc_latitudes, loc_longitudes)
+        row_max = np.full(n, -np.inf); np.maximum.at(row_max, loc_rows, loc_latitudes)
+        row_min = np.full(n, np.inf); np.minimum.at(row_min, loc_rows, loc_latitudes)
+        col_max = np.full(n, -np.inf); np.maximum.at(col_max, loc_cols, loc_longitudes)
+        col_min = np.full(n, np.inf); np.minimum.at(col_min, loc_cols, loc_longitudes)
+        below = np.concatenate(([-np.inf], np.maximum.accumulate(row_max)[:-1]))  # max latitude in rows < r
+        above = np.concatenate((np.minimum.accumulate(row_min[::-1])[::-1][1:], [np.inf]))  # min latitude in rows > r
+        left = np.concatenate(([-np.inf], np.maximum.accumulate(col_max)[:-1]))
+        right = np.concatenate((np.minimum.accumulate(col_min[::-1])[::-1][1:], [np.inf]))
+
+        # Location indices sorted by cell (stable, so location order is kept inside a cell)
+        loc_cells = loc_rows * n + loc_cols
+        by_cell = np.argsort(loc_cells, kind="stable")
+        cell_starts = np.searchsorted(loc_cells[by_cell], np.arange(n * n + 1))
+
+        customer_rows, customer_cols = cells(customer_latitudes, customer_longitudes)
+        customer_cells = customer_rows * n + customer_cols
+        by_customer_cell = np.argsort(customer_cells, kind="stable")
+        groups = np.split(by_customer_cell, np.flatnonzero(np.diff(customer_cells[by_customer_cell])) + 1)
+
+        nearest = [None] * len(customer_latitudes)
+        for group in groups:
+            row, col = customer_rows[group[0]], customer_cols[group[0]]
+            r0, r1, c0, c1 = max(row - 1, 0), min(row + 1, n - 1), max(col - 1, 0), min(col + 1, n - 1)
+            candidates = np.sort(np.concatenate([by_cell[cell_starts[r * n + c0]:cell_starts[r * n + c1 + 1]]
+                                                 for r in range(r0, r1 + 1)]))
+            if len(candidates) < k:
+                continue
+            group_latitudes, group_longitudes = customer_latitudes[group], customer_longitudes[group]
+            distances = self.strategy.calculate_distances(loc_latitudes[candidates], loc_longitudes[candidates],
+                                                          group_latitudes, group_longitudes)
+            columns = self._k_smallest(distances, k)
+            kth_distances = np.take_along_axis(distances, columns[:, -1:], axis=1)[:, 0]
+            edge = np.minimum.reduce([group_latitudes - below[r0], above[r1] - group_latitudes,
+                                      group_longitudes - left[c0], right[c1] - group_longitudes])
+            edge = np.maximum(edge, 0.0)
+            exact = kth_distances < np.sqrt(edge * edge)
+            for customer, indices, ok in zip(group.tolist(), candidates[columns].tolist(), exact.tolist()):
+                if ok:
+                    nearest[customer] = indices
+        return nearest
+
+    # Column indices of the k smallest distances per row, ordered by distance and then by
+    # location order, the same tie-breaking as the k-d tree and the linear scan
+    @staticmethod
+    def _k_smallest(distances, k: int):
+        candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.lexsort((candidates, candidate_distances), axis=-1)
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        # argpartition picks arbitrarily among ties at the k-th distance; redo those rows with a stable sort
+        kth_distances = candidate_distances.max(axis=1)
+        for row in np.flatnonzero((distances <= kth_distances[:, None]).sum(axis=1) > k):
+            candidates[row] = np.argsort(distances[row], kind="stable")[:k]
+        return candidates
+
+    def _assign_from_locations(self, customer, package_size: PackageSize, locations) -> bool:
+        for location in locations:
+            # The free count is a lock-free hint; acquire_locker decides under the location lock
+            if location.free_count(package_size) == 0:
+                continue
+            locker = location.acquire_locker(package_size)
+            if locker is None:
+                continue
+            pin = random.randint(100000, 999999)
+            while not location.claim_pin(pin, locker.index):
+                pin = random.randint(100000, 999999)
+            deadline = self.clock() + self.pickup_window
+            locker.store.expires_at[locker.index] = deadline
+            customer.assigned_locker = locker
+            customer.pin = pin
+            locker.add_observer(customer)
+            locker.assign(pin)
+            self.expiry_scheduler.schedule(deadline, location, locker.index)
+            return True
         return False
 
-# Location class representing a location with multiple lockers
+    # Method for a kiosk at a location to open the locker holding a PIN in O(1); frees the
+    # locker and returns it, or returns None when the PIN does not match an assigned locker
+    def pickup(self, location, pin: int):
+        slot = location.pin_slots.get(pin)
+        if slot is None:
+            return None
+        locker = Locker.view(location.store, slot)
+        return locker if location.release_locker(locker, expected_pin=pin) else None
+
+    # Method to free every locker whose pickup window has passed; returns how many were freed.
+    # Only due entries are touched, and each location's lock is taken once per call.
+    def expire_lockers(self, now: float = None) -> int:
+        now = self.clock() if now is None else now
+        return sum(location.expire_lockers(entries) for location, entries in self.expiry_scheduler.pop_due(now).items())
+
+# Location class representing a location with multiple lockers. Lockers are held as slots
+# of one LockerStore: the store passed in, else the store the lockers share, else a new one.
+# Lockers created without a store are adopted into it; lockers of another store are rejected.
 class Location:
-    def __init__(self, latitude: float, longitude: float, lockers: list):
+    def __init__(self, latitude: float, longitude: float, lockers: list, store: LockerStore = None):
         self.latitude = latitude
         self.longitude = longitude
-        self.lockers = lockers
+        if store is None:
+            store = next((locker.store for locker in lockers if not locker.store.detached), None)
+        self.store = store if store is not None else LockerStore()
+        for locker in lockers:
+            if locker.store is not self.store:
+                if not locker.store.detached:
+                    raise ValueError("all lockers of a location must share one LockerStore")
+                self.store.adopt(locker)
+        self.store_slot = self.store.register_location(self) if lockers else -1
+        self.locker_slots = array('q', (locker.index for locker in lockers))
+        # Per-size free lists of slots; the length is the O(1) free count. Stored reversed so
+        # lockers are handed out in the order they were given.
+        self.free_lockers = {size: array('q') for size in PackageSize}
+        self.pin_slots = {}  # PIN -> slot of the locker holding it; PINs are unique within a location
+        self.lock = threading.Lock()  # guards the free lists, PINs and releasing this location's lockers
+        assigned, sizes, location_slots = self.store.assigned, self.store.sizes, self.store.location_slots
+        for slot in reversed(self.locker_slots):
+            location_slots[slot] = self.store_slot
+            if not assigned[slot]:
+                self.free_lockers[PACKAGE_SIZES[sizes[slot]]].append(slot)
+
+    @property
+    def lockers(self) -> list:
+        return [Locker.view(self.store, slot) for slot in self.locker_slots]
+
+    def free_count(self, size: PackageSize) -> int:
+        return len(self.free_lockers[size])
+
+    # Pops a free locker; once popped it belongs to the caller until it is released
+    def acquire_locker(self, size: PackageSize):
+        with self.lock:
+            free = self.free_lockers[size]
+            return Locker.view(self.store, free.pop()) if free else None
+
+    # Reserves a PIN for an acquired locker; False when another locker here already holds it
+    def claim_pin(self, pin: int, slot: int) -> bool:
+        with self.lock:
+            return self.pin_slots.setdefault(pin, slot) == slot
+
+    # Frees the locker and returns it to the free list; a second release of the same
+    # locker is a no-op, so it can never sit in the free list twice. With expected_pin the
+    # locker is only freed while it still holds that PIN.
+    def release_locker(self, locker: Locker, expected_pin: int = None) -> bool:
+        with self.lock:
+            return self._release(locker.index, expected_pin)
+
+    # Frees the lockers from (slot, deadline) pairs that still carry that deadline
+    def expire_lockers(self, entries: list) -> int:
+        expires_at = self.store.expires_at
+        with self.lock:
+            return sum(self._release(slot) for slot, deadline in entries if expires_at[slot] == deadline)
+
+    def _release(self, slot: int, expected_pin: int = None) -> bool:
+        store = self.store
+        if not store.assigned[slot] or (expected_pin is not None and store.pins[slot] != expected_pin):
+            return False
+        pin = store.pins[slot]
+        if self.pin_slots.get(pin) == slot:
+            del self.pin_slots[pin]
+        store.assigned[slot] = 0
+        store.pins[slot] = 0
+        store.expires_at[slot] = 0.0
+        store.observers.pop(slot, None)
+        self.free_lockers[PACKAGE_SIZES[store.sizes[slot]]].append(slot)
+        return True
+
+# Customer that skips the notification print, so benchmarks time assignment rather than stdout
+class SilentCustomer(Customer):
+    def update(self, locker_id: int, pin: int):
+        pass
+
+# Benchmark comparing the k-d tree against the linear scan for nearest-location queries
+def benchmark_closest_location(sizes=(1_000, 100_000, 1_000_000), queries: int = 200, seed: int = 42):
+    rng = random.Random(seed)
+    print(f"{'locations':>10} {'build s':>9} {'kd-tree us/q':>13} {'linear us/q':>12} {'speedup':>8}")
+    for size in sizes:
+        AmazonLockerSystem._instance = None
+        system = AmazonLockerSystem(EuclideanDistanceStrategy())
+        start = time.perf_counter()
+        for _ in range(size):
+            system.add_location(Location(rng.uniform(-90, 90), rng.uniform(-180, 180), []))
+        build_seconds = time.perf_counter() - start
+        points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(queries)]
+
+        start = time.perf_counter()
+        indexed = [system.find_closest_location(lat, lon) for lat, lon in points]
+        indexed_us = (time.perf_counter() - start) / queries * 1e6
+
+        # The linear scan is O(n) per query, so it gets a smaller sample at large sizes
+        linear_queries = max(3, min(queries, 2_000_000 // size))
+        start = time.perf_counter()
+        linear = [system.find_closest_location_linear(lat, lon) for lat, lon in points[:linear_queries]]
+        linear_us = (time.perf_counter() - start) / linear_queries * 1e6
+
+        assert indexed[:linear_queries] == linear, "k-d tree disagrees with linear scan"
+        print(f"{size:>10} {build_seconds:>9.2f} {indexed_us:>13.1f} {linear_us:>12.1f} {linear_us / indexed_us:>7.0f}x")
+    AmazonLockerSystem._instance = None
+
+# Benchmark comparing assign_lockers_batch against assigning customers one at a time
+def benchmark_batch_assignment(location_counts=(1_000, 10_000), customers: int = 100_000,
+                               lockers_per_location: int = 60, seed: int = 7):
+    print(f"{'locations':>10} {'customers':>10} {'loop orders/s':>14} {'batch orders/s':>15} {'speedup':>8}")
+    for location_count in location_counts:
+        timings, outcomes = {}, {}
+        for mode in ("loop", "batch"):
+            AmazonLockerSystem._instance = None
+            system = AmazonLockerSystem(EuclideanDistanceStrategy())
+            rng = random.Random(seed)
+            store = system.store
+            for i in range(location_count):
+                lockers = [Locker(i * lockers_per_location + j, PackageSize(j % 3 + 1), store) for j in range(lockers_per_location)]
+                system.add_location(Location(rng.uniform(-90, 90), rng.uniform(-180, 180), lockers))
+            wave = [SilentCustomer(i, rng.uniform(-90, 90), rng.uniform(-180, 180)) for i in range(customers)]
+            sizes = [PackageSize(rng.randint(1, 3)) for _ in range(customers)]
+
+            random.seed(seed)  # same PINs in both modes
+            start = time.perf_counter()
+            if mode == "loop":
+                results = [system.assign_locker(customer, size) for customer, size in zip(wave, sizes)]
+            else:
+                results = system.assign_lockers_batch(wave, sizes)
+            timings[mode] = time.perf_counter() - start
+            outcomes[mode] = (results, [(c.assigned_locker.locker_id if c.assigned_locker else None, c.pin) for c in wave])
+
+        assert outcomes["loop"] == outcomes["batch"], "batch assignment disagrees with sequential assignment"
+        loop_rate, batch_rate = customers / timings["loop"], customers / timings["batch"]
+        print(f"{location_count:>10} {customers:>10} {loop_rate:>14.0f} {batch_rate:>15.0f} {batch_rate / loop_rate:>7.1f}x")
+    AmazonLockerSystem._instance = None
+
+# Benchmark of repeat orders from a fixed set of neighbourhoods with and without the distance
+# cache. Locations have no lockers so only the distance work is measured.
+def benchmark_distance_cache(locations: int = 5_000, neighbourhoods: int = 500, orders: int = 20_000, seed: int = 11):
+    import os
+    import tempfile
+
+    rng = random.Random(seed)
+    # A city-sized box around San Francisco
+    sites = [(37.6 + rng.random() * 0.3, -122.55 + rng.random() * 0.4) for _ in range(locations)]
+    centres = [(37.6 + rng.random() * 0.3, -122.55 + rng.random() * 0.4) for _ in range(neighbourhoods)]
+    # Repeat customers sit within a few metres of their neighbourhood centre
+    points = [(lat + rng.uniform(-2e-5, 2e-5), lon + rng.uniform(-2e-5, 2e-5))
+              for lat, lon in (rng.choice(centres) for _ in range(orders))]
+
+    haversine = HaversineDistanceStrategy()
+    matrix_path = os.path.join(tempfile.mkdtemp(), "road_distances.npz")
+    site_latitudes = np.array([lat for lat, _ in sites])
+    site_longitudes = np.array([lon for _, lon in sites])
+    centre_latitudes = np.array([lat for lat, _ in centres])
+    centre_longitudes = np.array([lon for _, lon in centres])
+    detour = np.array([rng.uniform(1.2, 1.6) for _ in range(locations)])
+    np.savez(matrix_path, origin_latitudes=centre_latitudes, origin_longitudes=centre_longitudes,
+             location_latitudes=site_latitudes, location_longitudes=site_longitudes,
+             distances=haversine.calculate_distances(site_latitudes, site_longitudes, centre_latitudes, centre_longitudes) * detour)
+
+    strategies = {
+        "haversine": haversine,
+        "haversine+cache": CachedDistanceStrategy(HaversineDistanceStrategy()),
+        "matrix": DistanceMatrixStrategy.from_file(matrix_path),
+        "matrix+cache": CachedDistanceStrategy(DistanceMatrixStrategy.from_file(matrix_path)),
+    }
+    print(f"{'strategy':>16} {'orders/s':>10} {'hit rate':>9}")
+    for name, strategy in strategies.items():
+        AmazonLockerSystem._instance = None
+        system = AmazonLockerSystem(strategy)
+        for lat, lon in sites:
+            system.add_location(Location(lat, lon, []))
+        start = time.perf_counter()
+        for i, (lat, lon) in enumerate(points):
+            system.assign_locker(SilentCustomer(i, lat, lon), PackageSize.SMALL)
+        rate = orders / (time.perf_counter() - start)
+        hit_rate = f"{strategy.hit_rate:.1%}" if isinstance(strategy, CachedDistanceStrategy) else "-"
+        print(f"{name:>16} {rate:>10.0f} {hit_rate:>9}")
+    AmazonLockerSystem._instance = None
+
+# Stress test: many threads order and pick up packages against the shared system while it
+# counts successful assignments; afterwards no locker may be held by two customers and every
+# free list must match the lockers that are actually free. Reports throughput per thread count
+# (on a GIL build of CPython the threads interleave rather than run in parallel).
+def benchmark_concurrent_assignment(thread_counts=(1, 2, 4, 8, 16), locations: int = 200,
+                                    lockers_per_location: int = 30, orders_per_thread: int = 20_000, seed: int = 5):
+    print(f"{'threads':>8} {'orders/s':>10} {'assigned':>9}")
+    for thread_count in thread_counts:
+        AmazonLockerSystem._instance = None
+        system = AmazonLockerSystem(EuclideanDistanceStrategy())
+        rng = random.Random(seed)
+        store = system.store
+        all_lockers = []
+        for i in range(locations):
+            lockers = [Locker(i * lockers_per_location + j, PackageSize(j % 3 + 1), store) for j in range(lockers_per_location)]
+            all_lockers.extend(lockers)
+            system.add_location(Location(rng.uniform(0, 10), rng.uniform(0, 10), lockers))
+
+        holders = [[] for _ in range(thread_count)]  # customers still holding a locker, per thread
+        barrier = threading.Barrier(thread_count + 1)
+
+        def worker(index: int):
+            worker_rng = random.Random(seed + index)
+            held = holders[index]
+            barrier.wait()
+            for order in range(orders_per_thread):
+                customer = SilentCustomer(order, worker_rng.uniform(0, 10), worker_rng.uniform(0, 10))
+                if system.assign_locker(customer, PackageSize(worker_rng.randint(1, 3))):
+                    held.append(customer)
+                # Pick up about half the packages so lockers keep getting freed and reused
+                if held and worker_rng.random() < 0.5:
+                    picked = held.pop(worker_rng.randrange(len(held)))
+                    picked.assigned_locker.remove_observer(picked)
+                    picked.assigned_locker.free()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        held = [customer for customers in holders for customer in customers]
+        held_lockers = [customer.assigned_locker for customer in held]
+        assert len(set(held_lockers)) == len(held_lockers), "locker assigned to two customers"
+        assert all(locker.is_assigned and locker.pin == customer.pin for locker, customer in zip(held_lockers, held))
+        assert sum(locker.is_assigned for locker in all_lockers) == len(held_lockers)
+        free_total = sum(len(free) for location in system.locations for free in location.free_lockers.values())
+        assert free_total == len(all_lockers) - len(held_lockers), "locker missing from the free lists"
+        assert sum(len(location.pin_slots) for location in system.locations) == len(held_lockers), "stale PIN index entry"
+        for location in system.locations:
+            for size, free in location.free_lockers.items():
+                assert len(set(free)) == len(free), "locker in a free list twice"
+                assert all(not store.assigned[slot] and store.sizes[slot] == size.value for slot in free)
+        print(f"{thread_count:>8} {thread_count * orders_per_thread / elapsed:>10.0f} {len(held_lockers):>9}")
+    AmazonLockerSystem._instance = None
+
+# Memory per locker: one object per locker with its own __dict__ and observer set (the layout
+# before LockerStore) against LockerStore columns plus each location's slot and free-list arrays
+def benchmark_locker_memory(lockers: int = 1_000_000, lockers_per_location: int = 50):
+    import tracemalloc
+
+    class ObjectLocker:
+        def __init__(self, locker_id: int, size: PackageSize):
+            self.locker_id = locker_id
+            self.size = size
+            self.is_assigned = False
+            self.pin = None
+            self.observers = set()
+            self.location = None
+
+    def measure(build):
+        tracemalloc.start()
+        kept = build()
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        return used / lockers
+
+    def objects():
+        # The old Location held its lockers in a list plus one free list per size
+        held = [ObjectLocker(i, PackageSize(i % 3 + 1)) for i in range(lockers)]
+        return held, list(held)
+
+    def columns():
+        store = LockerStore()
+        locations = []
+        for start in range(0, lockers, lockers_per_location):
+            views = [Locker(i, PackageSize(i % 3 + 1), store) for i in range(start, min(start + lockers_per_location, lockers))]
+            locations.append(Location(0.0, 0.0, views))
+        return store, locations
+
+    before, after = measure(objects), measure(columns)
+    print(f"{'layout':>10} {'bytes/locker':>13}")
+    print(f"{'objects':>10} {before:>13.1f}")
+    print(f"{'columnar':>10} {after:>13.1f}")
+    print(f"{'saving':>10} {before / after:>12.1f}x")
+
+# Benchmark of assignment throughput when every notification costs slow I/O, delivered inline
+# versus through the dispatcher (with a roomy queue and with a small one that pushes back)
+def benchmark_notifications(orders: int = 5_000, io_seconds: float = 0.0002, seed: int = 3):
+    class SlowCustomer(Customer):
+        def update(self, locker_id: int, pin: int):
+            time.sleep(io_seconds)  # stands in for an SMS/e-mail call
+
+    modes = {"inline": None,
+             "dispatcher": lambda: NotificationDispatcher(max_pending=orders * 2),
+             "dispatcher/256": lambda: NotificationDispatcher(max_pending=256)}
+    print(f"{'mode':>15} {'orders/s':>10} {'assign p99 ms':>14} {'delivered':>10} {'batch':>6} {'notify p99 ms':>14}")
+    for name, make_dispatcher in modes.items():
+        AmazonLockerSystem._instance = None
+        system = AmazonLockerSystem(EuclideanDistanceStrategy())
+        store = system.store
+        store.dispatcher = make_dispatcher() if make_dispatcher else None
+        rng = random.Random(seed)
+        for i in range(100):
+            system.add_location(Location(rng.uniform(0, 10), rng.uniform(0, 10),
+                                         [Locker(i * 60 + j, PackageSize(j % 3 + 1), store) for j in range(60)]))
+        latencies = []
+        start = time.perf_counter()
+        for order in range(orders):
+            began = time.perf_counter()
+            system.assign_locker(SlowCustomer(order, rng.uniform(0, 10), rng.uniform(0, 10)), PackageSize(rng.randint(1, 3)))
+            latencies.append(time.perf_counter() - began)
+        rate = orders / (time.perf_counter() - start)
+        latencies.sort()
+        assign_p99 = latencies[int(0.99 * len(latencies))] * 1e3
+        if store.dispatcher is None:
+            print(f"{name:>15} {rate:>10.0f} {assign_p99:>14.3f} {'-':>10} {'-':>6} {'-':>14}")
+            continue
+        store.dispatcher.close()
+        metrics = store.dispatcher.metrics()
+        print(f"{name:>15} {rate:>10.0f} {assign_p99:>14.3f} {metrics['delivered']:>10} "
+              f"{metrics['mean_batch']:>6.1f} {metrics['p99_ms']:>14.1f}")
+    AmazonLockerSystem._instance = None
+
+# Benchmarks: python "Amazon Locker Management.py" benchmark [name ...]
+BENCHMARKS = {
+    "closest_location": benchmark_closest_location,
+    "batch_assignment": benchmark_batch_assignment,
+    "distance_cache": benchmark_distance_cache,
+    "concurrent_assignment": benchmark_concurrent_assignment,
+    "locker_memory": benchmark_locker_memory,
+    "notifications": benchmark_notifications,
+}
+
+if __name__ == "__main__" and sys.argv[1:2] == ["benchmark"]:
+    for name in sys.argv[2:] or BENCHMARKS:
+        BENCHMARKS[name]()
+    sys.exit(0)
 
 # Example usage
 if __name__ == "__main__":
@@ -153,3 +1237,14 @@ if __name__ == "__main__":
 
     # Unassign locker with valid PIN
     customer1.unassign_locker(customer1.pin)
+
+    # Pick up at the location's kiosk with only the PIN
+    customer2 = Customer(2, 37.7750, -122.4195)
+    customer2.order_package(PackageSize.MEDIUM, amazon_locker_system)
+    picked_up = amazon_locker_system.pickup(location1, customer2.pin)
+    print(f"Kiosk: PIN {customer2.pin} opened locker ID - {picked_up.locker_id if picked_up else None}")
+
+    # Packages left past the pickup window are reclaimed in bulk
+    customer1.order_package(PackageSize.LARGE, amazon_locker_system)
+    expired = amazon_locker_system.expire_lockers(now=amazon_locker_system.clock() + amazon_locker_system.pickup_window + 1)
+    print(f"Expired lockers reclaimed: {expired}")
@@ -1,6 +1,26 @@
+import asyncio
+import itertools
+import json
+import mmap
+import os
 import random
+import struct
+import sys
+import time
+from array import array
 from typing import List, Tuple
 
+try:
+    import numpy as np
+except ImportError:  # MonteCarloSimulator falls back to a pure-Python loop over the table
+    np = None
+
+try:
+    from scipy import sparse
+    from scipy.sparse.linalg import spsolve
+except ImportError:  # MarkovChainSolver uses dense NumPy matrices instead
+    sparse = None
+
 
 # Core classes (Square, Snake, Ladder, Board)
 
@@ -26,6 +46,7 @@ class Board:
         self.squares = [Square(i) for i in range(1, size + 1)]
         self.snakes = {snake.start: snake.end for snake in snakes}
         self.ladders = {ladder.start: ladder.end for ladder in ladders}
+        self.transitions = None
 
     def get_destination(self, position):
         if position in self.snakes:
@@ -34,6 +55,17 @@ class Board:
             return self.ladders[position]
         return position
 
+    # Flat transition table: transitions[position * 6 + roll - 1] is where a token on position
+    # ends up after rolling roll, following Player.move (overshooting the last square means
+    # staying put). Compiled once per board; a NumPy int16 array when NumPy is available.
+    def compile_transitions(self):
+        if self.transitions is None:
+            size = len(self.squares)
+            table = [position if position + roll > size else self.get_destination(position + roll)
+                     for position in range(size + 1) for roll in range(1, 7)]
+            self.transitions = np.array(table, dtype=np.int16) if np is not None else table
+        return self.transitions
+
 
 # Singleton Die
 
@@ -50,6 +82,25 @@ class Die:
         return random.randint(1, 6)
 
 
+# Per-game die with its own seed (SplitMix64), so games are independent and replayable; it
+# holds a single integer where a random.Random carries about 2.5 KB of state
+
+class SeededDie:
+    __slots__ = ("state",)
+    MASK = (1 << 64) - 1
+
+    def __init__(self, seed: int):
+        self.state = seed & self.MASK
+
+    def roll(self):
+        self.state = (self.state + 0x9E3779B97F4A7C15) & self.MASK
+        z = self.state
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & self.MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & self.MASK
+        z ^= z >> 31
+        return ((z >> 32) * 6 >> 32) + 1
+
+
 # Player and PlayerFactory
 
 class Player:
@@ -94,6 +145,69 @@ class ConsoleObserver(Observer):
         print(f"{player_name} rolled a {roll} and moved to {position}")
 
 
+# Binary turn log: 4 bytes per turn (seat, roll, new position) in a columnar file. The file
+# starts with a header (magic, version, players, turns per block, die seed, turn count) and
+# the player names, then fixed-size blocks that each hold block_turns seats, then as many
+# rolls, then as many 16-bit positions. Consecutive games can share one log and one die
+# stream; a game ends on the turn that reaches the last square. Read back with TurnLog.
+
+class TurnLogObserver(Observer):
+    MAGIC = b"SLTL"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHHIQQI")
+    ALIGNMENT = 64
+
+    def __init__(self, path: str, player_names: List[str], seed: int = 0, block_turns: int = 4096):
+        self.seat_of = {name: seat for seat, name in enumerate(player_names)}
+        self.block_turns = block_turns
+        self.seed = seed
+        self.players = len(player_names)
+        names = json.dumps(list(player_names)).encode()
+        self.data_offset = -(-(self.HEADER.size + len(names)) // self.ALIGNMENT) * self.ALIGNMENT
+        self.file = open(path, "w+b")
+        self.file.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.players, block_turns, seed, 0, len(names)))
+        self.file.write(names.ljust(self.data_offset - self.HEADER.size, b"\0"))
+        self.seats = bytearray(block_turns)
+        self.rolls = bytearray(block_turns)
+        self.positions = array('H', bytes(2 * block_turns))
+        self.fill = 0
+        self.block = 0
+        self.turns = 0
+
+    def update(self, player_name: str, position: int, roll: int):
+        self.record(self.seat_of[player_name], roll, position)
+
+    def record(self, seat: int, roll: int, position: int):
+        fill = self.fill
+        self.seats[fill] = seat
+        self.rolls[fill] = roll
+        self.positions[fill] = position
+        self.fill = fill + 1
+        self.turns += 1
+        if self.fill == self.block_turns:
+            self._write_block()
+            self.block += 1
+            self.fill = 0
+
+    # Writes the partly filled block and the turn count, so the file is readable as it stands
+    def flush(self):
+        self._write_block()
+        self.file.seek(0)
+        self.file.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.players, self.block_turns, self.seed,
+                                         self.turns, self.data_offset - self.HEADER.size))
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def _write_block(self):
+        self.file.seek(self.data_offset + self.block * 4 * self.block_turns)
+        self.file.write(self.seats)
+        self.file.write(self.rolls)
+        self.file.write(self.positions.tobytes())
+
+
 # Singleton Game
 
 class Game:
@@ -107,12 +221,12 @@ class Game:
         return Game._instance
 
     def __init__(self, player_names: List[str], snake_positions: List[Tuple[int, int]],
-                 ladder_positions: List[Tuple[int, int]]):
+                 ladder_positions: List[Tuple[int, int]], die=None):
         snakes = BoardComponentFactory.create_snakes(snake_positions)
         ladders = BoardComponentFactory.create_ladders(ladder_positions)
         self.board = Board(100, snakes, ladders)
         self.players = PlayerFactory.create_players(player_names)
-        self.die = Die.get_instance()
+        self.die = die if die is not None else Die.get_instance()
         self.current_player_index = 0
         self.observers: List[Observer] = []
 
@@ -145,6 +259,842 @@ class Game:
         return current_player.position == len(self.board.squares)
 
 
+# Compact state of one hosted game: token positions in an unsigned-short array, the seat to
+# move, its own SeededDie and the winning seat once decided. Board, player names and
+# observers live on the SessionManager and are shared by its games.
+class GameSession:
+    __slots__ = ("game_id", "player_names", "positions", "current", "die", "turns", "winner")
+
+    def __init__(self, game_id: int, player_names: tuple, seed: int):
+        self.game_id = game_id
+        self.player_names = player_names
+        self.positions = array('H', [1]) * len(player_names)
+        self.current = 0
+        self.die = SeededDie(seed)
+        self.turns = 0
+        self.winner = None  # Seat of the winner
+
+    # Plays the current seat's turn on a compiled transition table; returns (seat, roll, position)
+    def play_turn(self, transitions: list, finish: int) -> tuple:
+        seat = self.current
+        roll = self.die.roll()
+        position = transitions[self.positions[seat] * 6 + roll - 1]
+        self.positions[seat] = position
+        self.turns += 1
+        if position == finish:
+            self.winner = seat
+        else:
+            self.current = (seat + 1) % len(self.positions)
+        return seat, roll, position
+
+# Hosts many independent games of one board layout in a process, replacing the Game and Die
+# singletons. Games are GameSession objects sharing the board's compiled transition table,
+# each with a die seeded from the manager's seed sequence (or an explicit seed). play()
+# drives one game as an asyncio task, yielding to the event loop between turns, so one loop
+# interleaves tens of thousands of matches; finished games are dropped from the manager.
+class SessionManager:
+    def __init__(self, snake_positions: List[Tuple[int, int]], ladder_positions: List[Tuple[int, int]],
+                 size: int = 100, seed: int = None):
+        self.board = Board(size, BoardComponentFactory.create_snakes(snake_positions),
+                           BoardComponentFactory.create_ladders(ladder_positions))
+        transitions = self.board.compile_transitions()
+        self.transitions = transitions.tolist() if np is not None else list(transitions)
+        self.finish = size
+        self.sessions = {}  # game_id -> GameSession, for games in progress
+        self.ids = itertools.count(1)
+        self.seeds = random.Random(seed)
+        self.observers: List[Observer] = []
+        self.turns_played = 0
+        self.games_finished = 0
+
+    def create_game(self, player_names: List[str], seed: int = None) -> GameSession:
+        seed = self.seeds.getrandbits(64) if seed is None else seed
+        session = GameSession(next(self.ids), tuple(player_names), seed)
+        self.sessions[session.game_id] = session
+        return session
+
+    def add_observer(self, observer: Observer):
+        self.observers.append(observer)
+
+    # Returns True when the turn won the game
+    def play_turn(self, game_id: int) -> bool:
+        session = self.sessions[game_id]
+        seat, roll, position = session.play_turn(self.transitions, self.finish)
+        self.turns_played += 1
+        for observer in self.observers:
+            observer.update(session.player_names[seat], position, roll)
+        if session.winner is not None:
+            del self.sessions[game_id]
+            self.games_finished += 1
+            return True
+        return False
+
+    # Plays a game to the end, waiting turn_interval seconds between turns; returns the winner
+    async def play(self, game_id: int, turn_interval: float = 0.0) -> str:
+        session = self.sessions[game_id]
+        while not self.play_turn(game_id):
+            await asyncio.sleep(turn_interval)
+        return session.player_names[session.winner]
+
+    async def play_games(self, count: int, player_names: List[str], turn_interval: float = 0.0) -> List[str]:
+        sessions = [self.create_game(player_names) for _ in range(count)]
+        return await asyncio.gather(*(self.play(session.game_id, turn_interval) for session in sessions))
+
+# Statistics of simulated games: game length counts every roll by every player up to and
+# including the winning one; winners holds the winning seat of each finished game
+class SimulationResult:
+    def __init__(self, game_lengths, winners, players: int, unfinished: int):
+        self.game_lengths = game_lengths
+        self.winners = winners
+        self.players = players
+        self.unfinished = unfinished  # Games still running after max_turns
+
+    @property
+    def games(self) -> int:
+        return len(self.game_lengths)
+
+    def mean_turns(self) -> float:
+        return float(np.mean(self.game_lengths)) if np is not None else sum(self.game_lengths) / self.games
+
+    def std_turns(self) -> float:
+        if np is not None:
+            return float(np.std(self.game_lengths))
+        mean = self.mean_turns()
+        return (sum((length - mean) ** 2 for length in self.game_lengths) / self.games) ** 0.5
+
+    def percentile(self, q: float) -> int:
+        ordered = sorted(self.game_lengths) if np is None else np.sort(self.game_lengths)
+        return int(ordered[min(len(ordered) - 1, int(q * len(ordered)))])
+
+    # Share of games won by each seat
+    def win_rates(self) -> List[float]:
+        counts = [0] * self.players
+        if np is not None:
+            counts = np.bincount(self.winners, minlength=self.players).tolist()
+        else:
+            for seat in self.winners:
+                counts[seat] += 1
+        return [count / self.games for count in counts]
+
+    # P(game length == n) for n = 0 .. longest game seen
+    def length_distribution(self) -> List[float]:
+        if np is not None:
+            return (np.bincount(self.game_lengths) / self.games).tolist()
+        counts = [0] * (max(self.game_lengths) + 1)
+        for length in self.game_lengths:
+            counts[length] += 1
+        return [count / self.games for count in counts]
+
+    def summary(self) -> dict:
+        return {"games": self.games, "mean_turns": self.mean_turns(), "std_turns": self.std_turns(),
+                "p50_turns": self.percentile(0.5), "p99_turns": self.percentile(0.99),
+                "win_rates": self.win_rates(), "unfinished": self.unfinished}
+
+# Monte Carlo engine over a board's compiled transition table. All games advance together:
+# each turn, the seat to move rolls for every running game at once and the new positions are
+# one gather from the table. Rolls come from random bytes: the table is widened to 252
+# columns (byte % 6 gives the roll) and bytes of 252 and up are redrawn, so rolls stay
+# uniform without a modulo per roll. Finished games are parked on an absorbing row and
+# dropped from the arrays once they make up half of them. Plays by the same rules as
+# Game.play_turn (players move in seat order, first to the last square wins).
+class MonteCarloSimulator:
+    ROLL_BYTES = 252  # Largest multiple of 6 below 256
+
+    def __init__(self, board: Board, players: int = 1, seed: int = None, max_turns: int = 100_000):
+        self.board = board
+        self.players = players
+        self.finish = len(board.squares)
+        self.table = board.compile_transitions()
+        self.max_turns = max_turns
+        self.rng = np.random.default_rng(seed) if np is not None else random.Random(seed)
+        if np is not None:
+            self.parked = self.finish + 1
+            rows = np.vstack([self.table.reshape(-1, 6), np.full((1, 6), self.parked, dtype=np.int16)])
+            self.wide_table = rows[:, np.arange(self.ROLL_BYTES) % 6].ravel()
+
+    def simulate(self, games: int, chunk_size: int = 1_000_000) -> SimulationResult:
+        if np is None:
+            return self._simulate_python(games)
+        lengths, winners, unfinished = [], [], 0
+        for start in range(0, games, chunk_size):
+            chunk_lengths, chunk_winners, chunk_unfinished = self._simulate_chunk(min(chunk_size, games - start))
+            lengths.append(chunk_lengths)
+            winners.append(chunk_winners)
+            unfinished += chunk_unfinished
+        return SimulationResult(np.concatenate(lengths), np.concatenate(winners), self.players, unfinished)
+
+    # Roll bytes in [0, 252), one per game
+    def _roll_bytes(self, count: int):
+        rolls = np.frombuffer(self.rng.bytes(count), dtype=np.uint8).copy()
+        redraw = rolls >= self.ROLL_BYTES
+        while redraw.any():
+            rolls[redraw] = np.frombuffer(self.rng.bytes(int(redraw.sum())), dtype=np.uint8)
+            redraw = rolls >= self.ROLL_BYTES
+        return rolls
+
+    def _simulate_chunk(self, games: int):
+        positions = np.ones((self.players, games), dtype=np.int16)
+        game_ids = np.arange(games)
+        lengths = np.zeros(games, dtype=np.int32)
+        winners = np.full(games, -1, dtype=np.int16)
+        parked = 0
+        turn = 0
+        while game_ids.size > parked and turn < self.max_turns:
+            seat = turn % self.players
+            # Row offsets in intp: int16 positions times ROLL_BYTES overflow past square 130
+            rows = positions[seat].astype(np.intp) * self.ROLL_BYTES
+            moved = self.wide_table.take(rows + self._roll_bytes(game_ids.size))
+            positions[seat] = moved
+            turn += 1
+            done = np.flatnonzero(moved == self.finish)
+            if done.size:
+                lengths[game_ids[done]] = turn
+                winners[game_ids[done]] = seat
+                positions[:, done] = self.parked
+                parked += done.size
+                if parked * 2 >= game_ids.size:
+                    running = positions[0] != self.parked
+                    game_ids = game_ids[running]
+                    positions = positions[:, running]
+                    parked = 0
+        finished = winners >= 0
+        return lengths[finished], winners[finished], int(game_ids.size - parked)
+
+    def _simulate_python(self, games: int) -> SimulationResult:
+        table, finish, players, roll = self.table, self.finish, self.players, self.rng.randrange
+        lengths, winners, unfinished = [], [], 0
+        for _ in range(games):
+            positions = [1] * players
+            for turn in range(self.max_turns):
+                seat = turn % players
+                positions[seat] = table[positions[seat] * 6 + roll(6)]
+                if positions[seat] == finish:
+                    lengths.append(turn + 1)
+                    winners.append(seat)
+                    break
+            else:
+                unfinished += 1
+        return SimulationResult(lengths, winners, players, unfinished)
+
+# Exact game statistics from the absorbing Markov chain of one token: the transient states are
+# the squares reachable from the start, the last square absorbs, and each roll moves with
+# probability 1/6 along the board's transition table. Expected turns solve (I - Q) t = 1; the
+# turn distribution propagates the state distribution one turn at a time until less than
+# tail_mass is left. Tokens move independently, so the multi-player results combine the
+# single-token distribution: seat s wins at its n-th roll if it finishes then while the seats
+# before it have not finished in n rolls and the seats after it not in n - 1. Squares from which
+# the last square cannot be reached are found up front (trapped); on such a board some games
+# never end, so the exact results do not exist and the solver raises ValueError right away.
+class MarkovChainSolver:
+    def __init__(self, board: Board, start: int = 1):
+        if np is None:
+            raise ImportError("MarkovChainSolver requires NumPy")
+        table = np.asarray(board.compile_transitions()).reshape(-1, 6)
+        self.finish = len(board.squares)
+        states, frontier = [start], [start]
+        seen = {start, self.finish}
+        while frontier:
+            position = frontier.pop()
+            for destination in table[position].tolist():
+                if destination not in seen:
+                    seen.add(destination)
+                    states.append(destination)
+                    frontier.append(destination)
+        self.states = states  # Transient states; states[0] is the start
+        index = {position: i for i, position in enumerate(states)}
+        rows, columns, absorbing = [], [], np.zeros(len(states))
+        predecessors = [[] for _ in states]
+        for i, position in enumerate(states):
+            for destination in table[position].tolist():
+                if destination == self.finish:
+                    absorbing[i] += 1 / 6
+                else:
+                    rows.append(i)
+                    columns.append(index[destination])
+                    predecessors[index[destination]].append(i)
+        finishing = set(np.flatnonzero(absorbing).tolist())
+        frontier = list(finishing)
+        while frontier:
+            for i in predecessors[frontier.pop()]:
+                if i not in finishing:
+                    finishing.add(i)
+                    frontier.append(i)
+        self.trapped = [position for i, position in enumerate(states) if i not in finishing]  # Cannot reach the last square
+        values = np.full(len(rows), 1 / 6)
+        if sparse is not None:
+            self.Q = sparse.csr_matrix((values, (rows, columns)), shape=(len(states), len(states)))
+        else:
+            self.Q = np.zeros((len(states), len(states)))
+            np.add.at(self.Q, (rows, columns), values)
+        self.absorbing = absorbing  # P(finish on the next roll) from each transient state
+        self.distribution = None
+
+    def expected_turns(self) -> float:
+        self._check_finishable()
+        identity = sparse.identity(len(self.states), format="csr") if sparse is not None else np.eye(len(self.states))
+        system = identity - self.Q
+        solve = spsolve if sparse is not None else np.linalg.solve
+        turns = solve(system.tocsc() if sparse is not None else system, np.ones(len(self.states)))
+        if not np.all(np.isfinite(turns)):
+            raise ValueError("the last square cannot be reached from every reachable square")
+        return float(turns[0])
+
+    # P(the token finishes on roll n) for n = 0, 1, ...; the tail beyond the last entry has
+    # probability below tail_mass. Boards that need more than max_turns raise ValueError.
+    def turn_distribution(self, tail_mass: float = 1e-12, max_turns: int = 10_000):
+        self._check_finishable()
+        if self.distribution is None:
+            transposed = self.Q.T.tocsr() if sparse is not None else self.Q.T
+            state = np.zeros(len(self.states))
+            state[0] = 1.0
+            probabilities = [0.0]
+            while state.sum() > tail_mass:
+                if len(probabilities) > max_turns:
+                    raise ValueError(f"more than {tail_mass} of games last over {max_turns} turns")
+                probabilities.append(float(state @ self.absorbing))
+                state = transposed @ state
+            self.distribution = np.array(probabilities)
+        return self.distribution
+
+    # P(the game ends on turn L) counting every player's rolls, and P(seat s wins)
+    def game_statistics(self, players: int = 1):
+        finish = self.turn_distribution()
+        survival = 1 - np.cumsum(finish)  # P(not finished after n rolls)
+        previous = np.concatenate(([1.0], survival[:-1]))
+        lengths = np.zeros(players * len(finish) + 1)
+        wins = np.zeros(players)
+        rolls = np.arange(len(finish))
+        for seat in range(players):
+            probability = finish * survival ** seat * previous ** (players - 1 - seat)
+            wins[seat] = probability.sum()
+            valid = rolls >= 1
+            np.add.at(lengths, players * (rolls[valid] - 1) + seat + 1, probability[valid])
+        return np.trim_zeros(lengths, "b"), wins
+
+    def expected_game_length(self, players: int = 1) -> float:
+        if players == 1:
+            return self.expected_turns()
+        lengths, _ = self.game_statistics(players)
+        return float(np.arange(len(lengths)) @ lengths)
+
+    def win_probabilities(self, players: int) -> List[float]:
+        return self.game_statistics(players)[1].tolist()
+
+    def _check_finishable(self):
+        if self.trapped:
+            raise ValueError(f"the last square cannot be reached from squares {self.trapped[:10]}")
+
+# Checks the solver against the simulator: mean game length within z standard errors, every
+# seat's win rate within z standard errors, and the total variation distance between the
+# exact and simulated length distributions below max_distance. Returns the measured values
+# and raises AssertionError on a mismatch.
+def validate_markov_chain(board: Board, players: int = 1, games: int = 1_000_000, seed: int = 20,
+                          z: float = 5.0, max_distance: float = 0.01) -> dict:
+    solver = MarkovChainSolver(board)
+    lengths, wins = solver.game_statistics(players)
+    expected = float(np.arange(len(lengths)) @ lengths)
+    result = MonteCarloSimulator(board, players=players, seed=seed).simulate(games)
+    simulated = np.array(result.length_distribution())
+    size = max(len(simulated), len(lengths))
+    distance = 0.5 * np.abs(np.pad(simulated, (0, size - len(simulated))) - np.pad(lengths, (0, size - len(lengths)))).sum()
+    mean_error = abs(result.mean_turns() - expected) / (result.std_turns() / games ** 0.5)
+    win_errors = [abs(rate - p) / (p * (1 - p) / games) ** 0.5 if 0 < p < 1 else abs(rate - p) * games
+                  for rate, p in zip(result.win_rates(), wins)]
+    assert mean_error < z, f"mean game length {result.mean_turns():.3f} vs exact {expected:.3f}"
+    assert max(win_errors) < z, f"win rates {result.win_rates()} vs exact {wins.tolist()}"
+    assert distance < max_distance, f"length distributions differ by {distance:.4f}"
+    return {"expected_turns": expected, "simulated_turns": result.mean_turns(), "mean_error_se": mean_error,
+            "win_probabilities": wins.tolist(), "simulated_win_rates": result.win_rates(),
+            "total_variation": float(distance)}
+
+# Exact mean and standard deviation of the game length for a layout; runs in the layout
+# search's worker processes. Layouts where a token can get stuck, or whose games run past the
+# solver's turn cap, score as infeasible (infinite mean and deviation).
+def evaluate_layout(layout: tuple, players: int = 1, size: int = 100) -> tuple:
+    snakes, ladders = layout
+    board = Board(size, BoardComponentFactory.create_snakes(snakes), BoardComponentFactory.create_ladders(ladders))
+    solver = MarkovChainSolver(board)
+    if solver.trapped:
+        return float("inf"), float("inf")
+    try:
+        lengths, _ = solver.game_statistics(players)
+    except ValueError:
+        return float("inf"), float("inf")
+    turns = np.arange(len(lengths))
+    mean = float(turns @ lengths)
+    return mean, float(np.sqrt(max(turns ** 2 @ lengths - mean * mean, 0.0)))
+
+# Searches snake and ladder layouts for a target mean and standard deviation of game length.
+# Each generation mutates the best layouts found so far (moving, or replacing, one snake or
+# ladder) and adds a few random ones. Layouts not scored before are evaluated exactly with
+# MarkovChainSolver in a ProcessPoolExecutor, and every score is memoized by the canonical
+# layout (sorted snakes and ladders). With a checkpoint path, the scores, generation and RNG
+# state are written after every generation, and a new optimizer resumes from the file.
+class LayoutOptimizer:
+    def __init__(self, target_mean: float, target_std: float, snakes: int = 10, ladders: int = 9, size: int = 100,
+                 players: int = 1, population: int = 64, elite: int = 8, workers: int = None,
+                 checkpoint: str = None, seed: int = None):
+        self.target_mean = target_mean
+        self.target_std = target_std
+        self.snakes = snakes
+        self.ladders = ladders
+        self.size = size
+        self.players = players
+        self.population = population
+        self.elite = elite
+        self.workers = workers or os.cpu_count()
+        self.checkpoint = checkpoint
+        self.rng = random.Random(seed)
+        self.scores = {}  # canonical layout -> (mean, std)
+        self.generation = 0
+        self.evaluations = 0
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self._load_checkpoint()
+
+    def score(self, metrics: tuple) -> float:
+        mean, std = metrics
+        return ((mean - self.target_mean) / self.target_mean) ** 2 + ((std - self.target_std) / self.target_std) ** 2
+
+    def best(self, count: int = 1) -> list:
+        return sorted(self.scores.items(), key=lambda item: self.score(item[1]))[:count]
+
+    # Runs generations more generations; returns the best (layout, (mean, std))
+    def run(self, generations: int) -> tuple:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(self.workers) as pool:
+            for _ in range(generations):
+                candidates = self._candidates()
+                unseen = [layout for layout in candidates if layout not in self.scores]
+                chunk_size = max(1, len(unseen) // (self.workers * 4))
+                for layout, metrics in zip(unseen, pool.map(evaluate_layout, unseen, itertools.repeat(self.players),
+                                                              itertools.repeat(self.size), chunksize=chunk_size)):
+                    self.scores[layout] = metrics
+                self.evaluations += len(unseen)
+                self.generation += 1
+                if self.checkpoint is not None:
+                    self._save_checkpoint()
+        return self.best()[0]
+
+    def _candidates(self) -> list:
+        parents = [layout for layout, _ in self.best(self.elite)]
+        candidates = set()
+        attempts = 0
+        while len(candidates) < self.population and attempts < self.population * 20:
+            attempts += 1
+            if parents and self.rng.random() < 0.8:
+                layout = self._mutate(self.rng.choice(parents))
+            else:
+                layout = self._random_layout()
+            if layout is not None:
+                candidates.add(layout)
+        return list(candidates)
+
+    def _random_layout(self):
+        starts = self.rng.sample(range(2, self.size), self.snakes + self.ladders)
+        snakes = [(start, self.rng.randint(1, start - 1)) for start in starts[:self.snakes]]
+        ladders = [(start, self.rng.randint(start + 1, self.size)) for start in starts[self.snakes:]]
+        return self._canonical(snakes, ladders)
+
+    # Moves one end of one snake or ladder, or replaces it with a random one
+    def _mutate(self, layout: tuple):
+        snakes, ladders = list(layout[0]), list(layout[1])
+        pieces, is_snake = (snakes, True) if self.rng.random() < len(snakes) / (len(snakes) + len(ladders)) else (ladders, False)
+        i = self.rng.randrange(len(pieces))
+        start, end = pieces[i]
+        if self.rng.random() < 0.25:
+            start = self.rng.randrange(2, self.size)
+            end = self.rng.randint(1, start - 1) if is_snake else self.rng.randint(start + 1, self.size)
+        elif self.rng.random() < 0.5:
+            start += self.rng.randint(-5, 5)
+        else:
+            end += self.rng.randint(-5, 5)
+        if not 2 <= start < self.size or not (1 <= end < start if is_snake else start < end <= self.size):
+            return None
+        pieces[i] = (start, end)
+        return self._canonical(snakes, ladders)
+
+    # Sorted tuples, or None when two pieces start on the same square
+    def _canonical(self, snakes: list, ladders: list):
+        starts = [start for start, _ in snakes] + [start for start, _ in ladders]
+        if len(set(starts)) != len(starts):
+            return None
+        return tuple(sorted(snakes)), tuple(sorted(ladders))
+
+    def _save_checkpoint(self):
+        state = {
+            "generation": self.generation,
+            "evaluations": self.evaluations,
+            "rng_state": self.rng.getstate(),
+            "scores": [[layout[0], layout[1], mean, std] for layout, (mean, std) in self.scores.items()],
+        }
+        with open(self.checkpoint + ".tmp", "w") as checkpoint_file:
+            json.dump(state, checkpoint_file)
+        os.replace(self.checkpoint + ".tmp", self.checkpoint)
+
+    def _load_checkpoint(self):
+        with open(self.checkpoint) as checkpoint_file:
+            state = json.load(checkpoint_file)
+        self.generation = state["generation"]
+        self.evaluations = state["evaluations"]
+        version, internal, gauss = state["rng_state"]
+        self.rng.setstate((version, tuple(internal), gauss))
+        self.scores = {(tuple(map(tuple, snakes)), tuple(map(tuple, ladders))): (mean, std)
+                       for snakes, ladders, mean, std in state["scores"]}
+
+# Memory-mapped reader for a TurnLogObserver file; seats, rolls and positions are NumPy arrays
+# over all logged turns
+class TurnLog:
+    def __init__(self, path: str):
+        if np is None:
+            raise ImportError("TurnLog requires NumPy")
+        with open(path, "rb") as log_file:
+            self.buffer = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.players, block_turns, self.seed, self.turns, names_length = \
+            TurnLogObserver.HEADER.unpack_from(self.buffer, 0)
+        if magic != TurnLogObserver.MAGIC or version != TurnLogObserver.VERSION:
+            raise ValueError(f"{path} is not a version {TurnLogObserver.VERSION} turn log")
+        start = TurnLogObserver.HEADER.size
+        self.player_names = json.loads(self.buffer[start:start + names_length].rstrip(b"\0"))
+        data_offset = -(-(start + names_length) // TurnLogObserver.ALIGNMENT) * TurnLogObserver.ALIGNMENT
+        blocks = -(-self.turns // block_turns)
+        block_bytes = 4 * block_turns
+
+        def column(dtype, offset: int):
+            itemsize = np.dtype(dtype).itemsize
+            view = np.ndarray((blocks, block_turns), dtype=dtype, buffer=self.buffer, offset=data_offset + offset,
+                              strides=(block_bytes, itemsize))
+            return view.reshape(-1)[:self.turns]
+
+        self.seats = column(np.uint8, 0)
+        self.rolls = column(np.uint8, block_turns)
+        self.positions = column(np.uint16, 2 * block_turns)
+
+class ReplayMismatchError(ValueError):
+    def __init__(self, turn: int, reason: str):
+        super().__init__(f"turn {turn}: {reason}")
+        self.turn = turn
+
+# Deterministic replay of a turn log against a board layout. verify() checks every turn at
+# once with NumPy: each roll against the SeededDie stream of the logged seed (SplitMix64 is
+# vectorisable), each seat against the turn order and each position against the transition
+# table. replay() re-derives the game from the rolls alone, one turn at a time, and keeps a
+# snapshot every snapshot_interval turns, so state_at(n) replays at most that many turns.
+class GameReplay:
+    GOLDEN = 0x9E3779B97F4A7C15
+
+    def __init__(self, log: TurnLog, snake_positions: List[Tuple[int, int]], ladder_positions: List[Tuple[int, int]],
+                 size: int = 100, snapshot_interval: int = 4096):
+        self.log = log
+        self.board = Board(size, BoardComponentFactory.create_snakes(snake_positions),
+                           BoardComponentFactory.create_ladders(ladder_positions))
+        self.table = np.asarray(self.board.compile_transitions())
+        self.finish = size
+        self.snapshot_interval = snapshot_interval
+        self.snapshots = []  # Per snapshot_interval turns: (games finished, seat to move, positions)
+
+    # Rolls the SeededDie(seed) produces for turns first .. first + count - 1
+    def die_rolls(self, first: int, count: int):
+        with np.errstate(over="ignore"):
+            z = np.uint64(self.log.seed) + np.arange(first + 1, first + count + 1, dtype=np.uint64) * np.uint64(self.GOLDEN)
+            z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            z ^= z >> np.uint64(31)
+        return ((z >> np.uint64(32)) * np.uint64(6) >> np.uint64(32)) + np.uint64(1)
+
+    def verify(self, chunk_size: int = 1 << 22) -> int:
+        log, players = self.log, self.log.players
+        seats, rolls, positions = log.seats, log.rolls.astype(np.int64), log.positions.astype(np.int64)
+        turns = np.arange(log.turns)
+        starts = np.ones(log.turns, dtype=bool)
+        starts[1:] = positions[:-1] == self.finish
+        game_start = np.maximum.accumulate(np.where(starts, turns, 0))
+        local = turns - game_start
+        previous = np.where(local >= players, positions[np.maximum(turns - players, 0)], 1)
+        checks = (
+            ("roll does not match the die", lambda first, last: rolls[first:last] != self.die_rolls(first, last - first)),
+            ("player out of turn", lambda first, last: seats[first:last] != local[first:last] % players),
+            ("position does not follow the board",
+             lambda first, last: self.table[previous[first:last] * 6 + rolls[first:last] - 1] != positions[first:last]),
+        )
+        for first in range(0, log.turns, chunk_size):
+            last = min(first + chunk_size, log.turns)
+            for reason, mismatches in checks:
+                bad = np.flatnonzero(mismatches(first, last))
+                if bad.size:
+                    raise ReplayMismatchError(first + int(bad[0]), reason)
+        return log.turns
+
+    # Re-derives every turn from the logged rolls and checks the logged positions
+    def replay(self) -> tuple:
+        table = self.table.tolist()
+        rolls, logged = self.log.rolls.tolist(), self.log.positions.tolist()
+        players, finish, interval = self.log.players, self.finish, self.snapshot_interval
+        positions, seat, games = [1] * players, 0, 0
+        self.snapshots = []
+        for turn, roll in enumerate(rolls):
+            if turn % interval == 0:
+                self.snapshots.append((games, seat, tuple(positions)))
+            position = table[positions[seat] * 6 + roll - 1]
+            if position != logged[turn]:
+                raise ReplayMismatchError(turn, f"replayed position {position}, logged {logged[turn]}")
+            if position == finish:
+                positions, seat, games = [1] * players, 0, games + 1
+            else:
+                positions[seat] = position
+                seat = (seat + 1) % players
+        return games, seat, positions
+
+    # State after the first turns turns: (games finished, seat to move, positions)
+    def state_at(self, turns: int) -> tuple:
+        if not self.snapshots:
+            self.replay()
+        if not 0 <= turns <= self.log.turns:
+            raise IndexError(f"turn {turns} is outside the log (0..{self.log.turns})")
+        index = min(turns // self.snapshot_interval, len(self.snapshots) - 1)
+        games, seat, positions = self.snapshots[index]
+        positions = list(positions)
+        for position in self.log.positions[index * self.snapshot_interval:turns].tolist():
+            if position == self.finish:
+                positions, seat, games = [1] * self.log.players, 0, games + 1
+            else:
+                positions[seat] = position
+                seat = (seat + 1) % self.log.players
+        return games, seat, positions
+
+# Game lengths from looping Game.play_turn, the baseline for the simulator benchmark
+def play_games(player_names: List[str], snake_positions: List[Tuple[int, int]],
+               ladder_positions: List[Tuple[int, int]], games: int) -> List[int]:
+    lengths = []
+    stdout = sys.stdout
+    sys.stdout = None  # play_turn prints the winner
+    try:
+        for _ in range(games):
+            game = Game(player_names, snake_positions, ladder_positions)
+            turns = 1
+            while not game.play_turn():
+                turns += 1
+            lengths.append(turns)
+    finally:
+        sys.stdout = stdout
+    return lengths
+
+# Games per second looping play_turn versus the vectorized simulator, with mean game length
+# from both as a sanity check
+def benchmark_monte_carlo(loop_games: int = 20_000, vector_games: int = 2_000_000, players: int = 3, seed: int = 19):
+    names = [f"player-{i}" for i in range(players)]
+    random.seed(seed)
+    start = time.perf_counter()
+    lengths = play_games(names, snake_positions, ladder_positions, loop_games)
+    loop_rate = loop_games / (time.perf_counter() - start)
+
+    board = Board(100, BoardComponentFactory.create_snakes(snake_positions), BoardComponentFactory.create_ladders(ladder_positions))
+    simulator = MonteCarloSimulator(board, players=players, seed=seed)
+    start = time.perf_counter()
+    result = simulator.simulate(vector_games)
+    vector_rate = vector_games / (time.perf_counter() - start)
+
+    print(f"play_turn loop: {loop_rate:>12,.0f} games/s, mean {sum(lengths) / len(lengths):.2f} turns")
+    print(f"simulator:      {vector_rate:>12,.0f} games/s, mean {result.mean_turns():.2f} turns "
+          f"(std {result.std_turns():.2f}, p99 {result.percentile(0.99)}), {vector_rate / loop_rate:.0f}x")
+    print("win rate by seat: " + ", ".join(f"{rate:.3f}" for rate in result.win_rates()))
+
+# Solver time for the default board, and the solver checked against 1M simulated games with
+# one and with three players, then on a 200-square board (the example layout at twice the
+# scale), where the simulator's row offsets no longer fit in 16 bits
+def benchmark_markov(games: int = 1_000_000, seed: int = 20):
+    board = Board(100, BoardComponentFactory.create_snakes(snake_positions), BoardComponentFactory.create_ladders(ladder_positions))
+    start = time.perf_counter()
+    solver = MarkovChainSolver(board)
+    expected = solver.expected_turns()
+    distribution = solver.turn_distribution()
+    elapsed = time.perf_counter() - start
+    print(f"solver: {elapsed * 1e3:.1f} ms, expected {expected:.4f} turns, distribution over {len(distribution) - 1} turns")
+    for players in (1, 3):
+        start = time.perf_counter()
+        check = validate_markov_chain(board, players=players, games=games, seed=seed)
+        print(f"{players} player(s): exact {check['expected_turns']:.3f} turns, simulated {check['simulated_turns']:.3f} "
+              f"({check['mean_error_se']:.2f} SE), total variation {check['total_variation']:.4f}, "
+              f"win probabilities {', '.join(f'{p:.4f}' for p in check['win_probabilities'])} "
+              f"({time.perf_counter() - start:.1f} s)")
+
+    large = Board(200, BoardComponentFactory.create_snakes([(2 * head, 2 * tail) for head, tail in snake_positions]),
+                  BoardComponentFactory.create_ladders([(2 * start, 2 * end) for start, end in ladder_positions]))
+    check = validate_markov_chain(large, players=2, games=games, seed=seed)
+    print(f"200 squares, 2 players: exact {check['expected_turns']:.3f} turns, simulated {check['simulated_turns']:.3f} "
+          f"({check['mean_error_se']:.2f} SE), total variation {check['total_variation']:.4f}")
+
+# Load test of SessionManager: memory per hosted game, then concurrent games played to the end
+# on one event loop with turns back to back (the loop's turn capacity) and with a paced
+# turn_interval (how many games a turn rate sustains, and how late turns run)
+def benchmark_sessions(concurrency=(1_000, 10_000, 50_000), paced_games: int = 20_000, turn_interval: float = 0.5,
+                       paced_seconds: float = 5.25, seed: int = 21):
+    import tracemalloc
+
+    names = ["Alice", "Bob", "Charlie"]
+    manager = SessionManager(snake_positions, ladder_positions, seed=seed)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(10_000):
+        manager.create_game(names)
+    per_game = (tracemalloc.get_traced_memory()[0] - before) / 10_000
+    tracemalloc.stop()
+    print(f"memory: {per_game:.0f} bytes per hosted game")
+
+    # The manager's games match Game driven by the same seeded die
+    session = manager.create_game(names, seed=seed)
+    while not manager.play_turn(session.game_id):
+        pass
+    game = Game(names, snake_positions, ladder_positions, die=SeededDie(seed))
+    stdout, sys.stdout = sys.stdout, None
+    try:
+        while not game.play_turn():
+            pass
+    finally:
+        sys.stdout = stdout
+    assert [player.position for player in game.players] == session.positions.tolist()
+
+    for games in concurrency:
+        manager = SessionManager(snake_positions, ladder_positions, seed=seed)
+        start = time.perf_counter()
+        asyncio.run(manager.play_games(games, names))
+        elapsed = time.perf_counter() - start
+        print(f"{games:>7,} concurrent games: {manager.turns_played / elapsed:>9,.0f} turns/s, "
+              f"{manager.games_finished / elapsed:>7,.0f} games/s")
+
+    async def paced():
+        manager = SessionManager(snake_positions, ladder_positions, seed=seed)
+        lateness = []
+
+        async def player(game_id: int):
+            while True:
+                due = time.perf_counter() + turn_interval
+                await asyncio.sleep(turn_interval)
+                lateness.append(time.perf_counter() - due)
+                if manager.play_turn(game_id):
+                    return
+
+        tasks = [asyncio.create_task(player(manager.create_game(names).game_id)) for _ in range(paced_games)]
+        await asyncio.sleep(paced_seconds)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        lateness.sort()
+        return manager.turns_played / paced_seconds, lateness[len(lateness) // 2], lateness[int(len(lateness) * 0.99)]
+
+    rate, p50, p99 = asyncio.run(paced())
+    print(f"{paced_games:,} games at one turn per {turn_interval} s: {rate:,.0f} turns/s "
+          f"(target {paced_games * int(paced_seconds / turn_interval) / paced_seconds:,.0f}), turn lateness p50 {p50 * 1e3:.1f} ms, p99 {p99 * 1e3:.1f} ms")
+
+# Layout search for a 30-turn mean with a 15-turn standard deviation: evaluations/s with one
+# worker and with every core, then a run interrupted after half its generations and resumed
+# from the checkpoint file, which must end on the same layout as the uninterrupted run
+def benchmark_layout_search(generations: int = 10, population: int = 64, seed: int = 22):
+    import shutil
+    import tempfile
+
+    target_mean, target_std = 30.0, 15.0
+    rates = {}
+    for workers in sorted({1, os.cpu_count()}):
+        optimizer = LayoutOptimizer(target_mean, target_std, population=population, workers=workers, seed=seed)
+        start = time.perf_counter()
+        uninterrupted, (mean, std) = optimizer.run(generations)
+        rates[workers] = optimizer.evaluations / (time.perf_counter() - start)
+        print(f"{workers:>3} worker(s): {rates[workers]:>6.0f} layouts/s ({optimizer.evaluations} evaluated), "
+              f"best mean {mean:.2f}, std {std:.2f}")
+    if len(rates) > 1:
+        print(f"speed-up on {os.cpu_count()} cores: {rates[os.cpu_count()] / rates[1]:.1f}x")
+
+    directory = tempfile.mkdtemp(prefix="layout-search-")
+    try:
+        path = os.path.join(directory, "checkpoint.json")
+        LayoutOptimizer(target_mean, target_std, population=population, checkpoint=path, seed=seed).run(generations // 2)
+        resumed = LayoutOptimizer(target_mean, target_std, population=population, checkpoint=path, seed=seed)
+        print(f"resumed at generation {resumed.generation} with {len(resumed.scores)} memoized layouts")
+        layout, (mean, std) = resumed.run(generations - resumed.generation)
+        assert layout == uninterrupted
+        print(f"best after {resumed.generation} generations: mean {mean:.2f}, std {std:.2f}")
+        print(f"  snakes {list(layout[0])}")
+        print(f"  ladders {list(layout[1])}")
+    finally:
+        shutil.rmtree(directory)
+
+# Turn log throughput: back-to-back games written through TurnLogObserver.record, then
+# vectorised verification, full sequential replay and random seeks through the snapshots.
+# A real Game driven by a SeededDie and the observer must replay to its final positions.
+def benchmark_turn_log(turns: int = 2_000_000, players: int = 4, seed: int = 23, seeks: int = 1_000):
+    import shutil
+    import tempfile
+
+    board = Board(100, BoardComponentFactory.create_snakes(snake_positions), BoardComponentFactory.create_ladders(ladder_positions))
+    table = list(board.compile_transitions())
+    names = [f"player-{i}" for i in range(players)]
+    directory = tempfile.mkdtemp(prefix="turn-log-")
+    path = os.path.join(directory, "turns.sltl")
+    try:
+        observer = TurnLogObserver(path, names, seed=seed)
+        record, roll = observer.record, SeededDie(seed).roll
+        positions, seat = [1] * players, 0
+        start = time.perf_counter()
+        for _ in range(turns):
+            die = roll()
+            position = table[positions[seat] * 6 + die - 1]
+            record(seat, die, position)
+            if position == 100:
+                positions, seat = [1] * players, 0
+            else:
+                positions[seat] = position
+                seat = (seat + 1) % players
+        observer.close()
+        write_rate = turns / (time.perf_counter() - start)
+        size = os.path.getsize(path)
+        print(f"write:  {write_rate:>12,.0f} turns/s (game loop included), {size / turns:.2f} bytes/turn")
+
+        log = TurnLog(path)
+        replay = GameReplay(log, snake_positions, ladder_positions)
+        start = time.perf_counter()
+        replay.verify()
+        print(f"verify: {turns / (time.perf_counter() - start):>12,.0f} turns/s")
+        start = time.perf_counter()
+        games, _, final = replay.replay()
+        print(f"replay: {turns / (time.perf_counter() - start):>12,.0f} turns/s, {games:,} games, "
+              f"{len(replay.snapshots):,} snapshots")
+        assert final == positions
+
+        rng = random.Random(seed)
+        targets = [rng.randrange(turns + 1) for _ in range(seeks)]
+        start = time.perf_counter()
+        for target in targets:
+            replay.state_at(target)
+        print(f"seek:   {(time.perf_counter() - start) / seeks * 1e6:>12,.1f} us per state_at")
+
+        log.buffer.close()
+        game = Game(names, snake_positions, ladder_positions, die=SeededDie(seed))
+        game_observer = TurnLogObserver(path, names, seed=seed)
+        game.add_observer(game_observer)
+        while not game.play_turn():
+            pass
+        game_observer.close()
+        log = TurnLog(path)
+        replay = GameReplay(log, snake_positions, ladder_positions, snapshot_interval=16)
+        replay.verify()
+        assert replay.state_at(log.turns) == (1, 0, [1] * players)
+        _, winner, expected = replay.state_at(log.turns - 1)
+        expected[winner] = 100
+        assert expected == [player.position for player in game.players]
+        print(f"Game replay: {log.turns} turns, positions match the live game")
+        log.buffer.close()
+    finally:
+        shutil.rmtree(directory)
+
+BENCHMARKS = {
+    "monte_carlo": benchmark_monte_carlo,
+    "markov": benchmark_markov,
+    "sessions": benchmark_sessions,
+    "layout_search": benchmark_layout_search,
+    "turn_log": benchmark_turn_log,
+}
+
 # Example game setup
 
 snake_positions = [(16, 6), (47, 26), (49, 11), (56, 53), (62, 19),
@@ -152,14 +1102,21 @@ snake_positions = [(16, 6), (47, 26), (49, 11), (56, 53), (62, 19),
 ladder_positions = [(1, 38), (4, 14), (9, 31), (21, 42), (28, 84),
                     (36, 44), (51, 67), (71, 91), (80, 100)]
 
-# Get the game instance
-game = Game.get_instance(["Alice", "Bob", "Charlie"], snake_positions, ladder_positions)
+# Benchmarks: python "Snake and Ladder Code.py" benchmark [name ...]
+if __name__ == "__main__" and sys.argv[1:2] == ["benchmark"]:
+    for name in sys.argv[2:] or BENCHMARKS:
+        BENCHMARKS[name]()
+    sys.exit(0)
+
+if __name__ == "__main__":
+    # Get the game instance
+    game = Game.get_instance(["Alice", "Bob", "Charlie"], snake_positions, ladder_positions)
 
-# Adding observers
-console_observer = ConsoleObserver()
-game.add_observer(console_observer)
+    # Adding observers
+    console_observer = ConsoleObserver()
+    game.add_observer(console_observer)
 
-# Play the game
-while True:
-    if game.play_turn():
-        break
+    # Play the game
+    while True:
+        if game.play_turn():
+            break
@@ -1,5 +1,13 @@
+import random
+import sys
+import time
 from enum import Enum
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # VendingFleet needs NumPy; a single VendingMachine does not
+    np = None
 
 class Item(Enum):
     COKE = ("Coke", 25)
@@ -24,6 +32,9 @@ class Coin(Enum):
     DIME = 10
     QUARTER = 25
 
+# Coins from the largest value down, computed once instead of sorting Coin on every request
+DENOMINATIONS = sorted(Coin, key=lambda coin: coin.value, reverse=True)
+
 class NotFullPaidException(Exception):
     pass
 
@@ -94,10 +105,96 @@ class ProcessingTransaction(State):
         vending_machine.set_state(Idle())
         return change
 
+# Fewest-coin change from a limited supply of each coin (bounded change-making). For a coin
+# inventory, given as counts per DENOMINATIONS entry, the table holds the best plan (coins
+# of each denomination to hand out) for every amount up to the limit, or None if the amount
+# cannot be paid exactly, so a lookup is O(1). No amount up to the limit needs more than
+# limit // value coins of a value, so tables are keyed on the counts capped there: once a
+# machine holds that many of a coin, paying it out or banking more leaves the table as it
+# is. Adding a coin below its cap derives the new table from the cached one in one pass;
+# removing one rebuilds the table unless that inventory is still cached. The cache evicts
+# the least recently used table. Larger amounts are solved on demand.
+class ChangeMaker:
+    def __init__(self, limit: int = 100, cache_size: int = 64):
+        self.limit = limit
+        self.cache_size = cache_size
+        self.caps = tuple(limit // coin.value for coin in DENOMINATIONS)
+        self.tables = {}  # Capped counts -> table, least recently used first
+        self.builds = 0
+
+    def key(self, counts: tuple) -> tuple:
+        return tuple(map(min, counts, self.caps))
+
+    def table(self, counts: tuple) -> list:
+        key = self.key(counts)
+        table = self.tables.pop(key, None)
+        if table is None:
+            table = self.solve(key, min(self.total(key), self.limit))
+            self.builds += 1
+            self.store(key, table)
+        else:
+            self.tables[key] = table  # Now the most recently used
+        return table
+
+    def plan(self, counts: tuple, amount: int) -> Optional[tuple]:
+        if amount <= self.limit:
+            table = self.table(counts)
+            return table[amount] if amount < len(table) else None
+        if amount > self.total(counts):
+            return None
+        return self.solve(counts, amount)[amount]
+
+    # Carries the table for counts over to the inventory with one more coin
+    def add_coin(self, counts: tuple, coin: Coin) -> None:
+        key = self.key(counts)
+        index = DENOMINATIONS.index(coin)
+        table = self.tables.get(key)
+        if table is None or key[index] == self.caps[index]:
+            return
+        added = key[:index] + (key[index] + 1,) + key[index + 1:]
+        table = table + [None] * (min(self.total(added), self.limit) + 1 - len(table))
+        for amount in range(len(table) - 1, coin.value - 1, -1):
+            base = table[amount - coin.value]
+            if base is not None and (table[amount] is None or sum(base) + 1 < sum(table[amount])):
+                table[amount] = base[:index] + (base[index] + 1,) + base[index + 1:]
+        self.store(added, table)
+
+    def store(self, key: tuple, table: list) -> None:
+        self.tables.pop(key, None)
+        if len(self.tables) >= self.cache_size:
+            del self.tables[next(iter(self.tables))]
+        self.tables[key] = table
+
+    @staticmethod
+    def total(counts: tuple) -> int:
+        return sum(coin.value * count for coin, count in zip(DENOMINATIONS, counts))
+
+    # Bounded knapsack: each coin's count is split into chunks of 1, 2, 4, ... coins, and
+    # each chunk is offered once, which can make up any count from zero to the supply
+    @staticmethod
+    def solve(counts: tuple, limit: int) -> list:
+        used = [0] + [float("inf")] * limit
+        plans = [(0,) * len(counts)] + [None] * limit
+        for index, (coin, count) in enumerate(zip(DENOMINATIONS, counts)):
+            chunk = 1
+            while count > 0:
+                take = min(chunk, count)
+                count -= take
+                chunk *= 2
+                step = take * coin.value
+                for amount in range(limit, step - 1, -1):
+                    candidate = used[amount - step] + take
+                    if candidate < used[amount]:
+                        used[amount] = candidate
+                        base = plans[amount - step]
+                        plans[amount] = base[:index] + (base[index] + take,) + base[index + 1:]
+        return plans
+
 class Inventory:
-    def __init__(self):
+    def __init__(self, change_maker: Optional[ChangeMaker] = None):
         self.items = {item: 5 for item in Item}
         self.coins = {coin: 5 for coin in Coin}
+        self.change_maker = change_maker if change_maker is not None else ChangeMaker()
 
     def has_item(self, item: Item) -> bool:
         return self.items.get(item, 0) > 0
@@ -111,23 +208,29 @@ class Inventory:
     def add_item(self, item: Item) -> None:
         self.items[item] += 1
 
+    def coin_counts(self) -> tuple:
+        return tuple(map(self.coins.__getitem__, DENOMINATIONS))
+
+    # Fewest coins (per DENOMINATIONS entry) that pay amount exactly, or None
+    def change_plan(self, amount: int) -> Optional[tuple]:
+        return self.change_maker.plan(self.coin_counts(), amount)
+
     def has_change(self, amount: int) -> bool:
-        return amount <= sum(coin.value * count for coin, count in self.coins.items())
+        return self.change_plan(amount) is not None
 
     def deduct_change(self, amount: int) -> List[Coin]:
-        change = []
-        remaining = amount
-        for coin in sorted(Coin, key=lambda x: x.value, reverse=True):
-            while remaining >= coin.value and self.coins[coin] > 0:
-                change.append(coin)
-                remaining -= coin.value
-                self.coins[coin] -= 1
-        if remaining != 0:
+        plan = self.change_plan(amount)
+        if plan is None:
             raise NotSufficientChangeException("Not sufficient change available")
+        change = []
+        for coin, count in zip(DENOMINATIONS, plan):
+            self.coins[coin] -= count
+            change.extend([coin] * count)
         return change
 
     def add_change(self, coins: List[Coin]) -> None:
         for coin in coins:
+            self.change_maker.add_coin(self.coin_counts(), coin)
             self.coins[coin] += 1
 
 class VendingMachine:
@@ -163,6 +266,330 @@ class VendingMachine:
         self.current_item = None
         self.state = Idle()
 
+# Many machines in one process. Per-machine state lives in compact arrays rather than
+# Inventory and State objects: item and coin counts are (machines x items) and
+# (machines x DENOMINATIONS) matrices, prices are per machine, and the state is a small
+# int (IDLE, SELECTING_ITEM, PROCESSING_TRANSACTION). Bulk operations (restock, price
+# changes, low-stock queries, sales telemetry) work on every selected machine at once, and
+# the single-machine operations follow the same rules as the State classes. Every method
+# that takes machines accepts None for the whole fleet, an index array or a boolean mask.
+class VendingFleet:
+    IDLE, SELECTING_ITEM, PROCESSING_TRANSACTION = range(3)
+    ITEMS = list(Item)
+    NO_ITEM = -1
+
+    def __init__(self, machines: int, item_stock: int = 5, coin_stock: int = 5,
+                 change_maker: Optional[ChangeMaker] = None):
+        if np is None:
+            raise ImportError("VendingFleet requires NumPy")
+        self.machines = machines
+        self.items = np.full((machines, len(self.ITEMS)), item_stock, dtype=np.uint16)
+        self.coins = np.full((machines, len(DENOMINATIONS)), coin_stock, dtype=np.uint16)
+        self.prices = np.tile(np.array([item.price for item in self.ITEMS], dtype=np.uint16), (machines, 1))
+        self.states = np.full(machines, self.IDLE, dtype=np.uint8)
+        self.balances = np.zeros(machines, dtype=np.uint32)
+        self.current_items = np.full(machines, self.NO_ITEM, dtype=np.int8)
+        self.coin_values = np.array([coin.value for coin in DENOMINATIONS], dtype=np.uint32)
+        # Machines restocked the same way share coin inventories, so one table cache serves them all
+        self.change_maker = change_maker if change_maker is not None else ChangeMaker(cache_size=4096)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.items, self.coins, self.prices, self.states,
+                                              self.balances, self.current_items))
+
+    # Bulk operations
+
+    # Tops up the selected items to level; returns the units loaded per machine
+    def restock(self, level: int, machines=None, items: Optional[List[Item]] = None):
+        machines = slice(None) if machines is None else machines
+        loaded = 0
+        for item in self.ITEMS if items is None else items:
+            column = self.ITEMS.index(item)
+            stock = self.items[machines, column]
+            loaded = loaded + (np.maximum(stock, level) - stock)
+            self.items[machines, column] = np.maximum(stock, level)
+        return loaded
+
+    def restock_coins(self, level: int, machines=None) -> None:
+        machines = slice(None) if machines is None else machines
+        self.coins[machines] = np.maximum(self.coins[machines], level)
+
+    # price may be one value or one per selected machine
+    def set_price(self, item: Item, price, machines=None) -> None:
+        machines = slice(None) if machines is None else machines
+        self.prices[machines, self.ITEMS.index(item)] = price
+
+    # Machines holding fewer than threshold units of the item, or of any item
+    def low_stock(self, threshold: int, item: Optional[Item] = None):
+        if item is not None:
+            return np.flatnonzero(self.items[:, self.ITEMS.index(item)] < threshold)
+        return np.flatnonzero((self.items < threshold).any(axis=1))
+
+    # Machines whose coins add up to less than amount
+    def low_change(self, amount: int):
+        return np.flatnonzero(self.coins @ self.coin_values < amount)
+
+    # Applies a batch of sales reported by the machines (telemetry); every sale in the batch
+    # is checked against stock before any is applied. Returns revenue in cents.
+    def record_sales(self, machines, items) -> int:
+        cells = np.asarray(machines, dtype=np.int64) * len(self.ITEMS) + np.asarray(items, dtype=np.int64)
+        sold = np.bincount(cells, minlength=self.items.size).reshape(self.items.shape)
+        if (sold > self.items).any():
+            raise SoldOutException(f"{int((sold > self.items).any(axis=1).sum())} machine(s) reported more sales than stock")
+        self.items -= sold.astype(np.uint16)
+        return int((sold * self.prices).sum())
+
+    # Single-machine operations, as VendingMachine does them through its State objects
+
+    def select_item(self, machine: int, selected_item: Item) -> None:
+        state = self.states[machine]
+        if state == self.PROCESSING_TRANSACTION:
+            raise NotFullPaidException("Transaction in progress. Please wait.")
+        if state == self.IDLE:
+            column = self.ITEMS.index(selected_item)
+            if self.items[machine, column] == 0:
+                raise SoldOutException("Item is sold out")
+            self.current_items[machine] = column
+            self.states[machine] = self.SELECTING_ITEM
+
+    def insert_coin(self, machine: int, coin: Coin) -> None:
+        state = self.states[machine]
+        if state == self.PROCESSING_TRANSACTION:
+            raise NotFullPaidException("Transaction in progress. Please wait.")
+        if state == self.SELECTING_ITEM:
+            self.balances[machine] += coin.value
+
+    def collect_item_and_change(self, machine: int) -> Optional[Tuple[Item, List[Coin]]]:
+        state = self.states[machine]
+        if state == self.PROCESSING_TRANSACTION:
+            raise NotFullPaidException("Transaction in progress. Please wait.")
+        if state == self.IDLE:
+            return None
+        column = int(self.current_items[machine])
+        price = int(self.prices[machine, column])
+        balance = int(self.balances[machine])
+        if balance < price:
+            raise NotFullPaidException("Amount not fully paid")
+        change = self.deduct_change(machine, balance - price)
+        self.items[machine, column] -= 1
+        self._reset(machine)
+        return self.ITEMS[column], change
+
+    def refund(self, machine: int) -> Optional[List[Coin]]:
+        if self.states[machine] == self.IDLE:
+            return None
+        change = self.deduct_change(machine, int(self.balances[machine]))
+        self._reset(machine)
+        return change
+
+    def deduct_change(self, machine: int, amount: int) -> List[Coin]:
+        plan = self.change_maker.plan(tuple(self.coins[machine].tolist()), amount)
+        if plan is None:
+            raise NotSufficientChangeException("Not sufficient change available")
+        self.coins[machine] -= np.array(plan, dtype=np.uint16)
+        return [coin for coin, count in zip(DENOMINATIONS, plan) for _ in range(count)]
+
+    def _reset(self, machine: int) -> None:
+        self.balances[machine] = 0
+        self.current_items[machine] = self.NO_ITEM
+        self.states[machine] = self.IDLE
+
+# The original greedy change: largest coin first while it fits, which can fail when change exists
+def greedy_change(coins: dict, amount: int) -> Optional[tuple]:
+    plan = []
+    for coin in sorted(Coin, key=lambda x: x.value, reverse=True):
+        take = min(amount // coin.value, coins[coin])
+        plan.append(take)
+        amount -= take * coin.value
+    return tuple(plan) if amount == 0 else None
+
+# Change-making on random coin inventories (0-6 of each coin) and amounts up to 100 cents:
+# how often greedy fails when exact change exists, checked against an exhaustive search,
+# and the cost per request of greedy, a cold table build and a cached lookup, plus a run of
+# sales where the machine banks the customer's coins and pays change from what it holds
+def benchmark_change(inventories: int = 2_000, amounts: int = 100, seed: int = 24):
+    rng = random.Random(seed)
+    samples = [({coin: rng.randint(0, 6) for coin in Coin}, rng.randint(1, amounts)) for _ in range(inventories)]
+    greedy_misses = optimal_found = 0
+    for coins, amount in samples:
+        counts = tuple(coins[coin] for coin in DENOMINATIONS)
+        plan = ChangeMaker(cache_size=1).plan(counts, amount)
+        fewest = min((sum(combo) for combo in _combinations(counts)
+                      if sum(coin.value * n for coin, n in zip(DENOMINATIONS, combo)) == amount), default=None)
+        assert (plan is None) == (fewest is None) and (plan is None or sum(plan) == fewest)
+        if plan is not None:
+            optimal_found += 1
+            assert all(n <= counts[i] for i, n in enumerate(plan))
+            greedy_misses += greedy_change(coins, amount) is None
+    print(f"exact change exists for {optimal_found:,} of {inventories:,} requests; greedy failed on {greedy_misses:,}, "
+          f"the solver on none (fewest coins every time)")
+
+    start = time.perf_counter()
+    for coins, amount in samples:
+        greedy_change(coins, amount)
+    greedy_us = (time.perf_counter() - start) / inventories * 1e6
+    maker = ChangeMaker(cache_size=inventories)
+    start = time.perf_counter()
+    for coins, amount in samples:
+        maker.plan(tuple(coins[coin] for coin in DENOMINATIONS), amount)
+    cold_us = (time.perf_counter() - start) / inventories * 1e6
+    start = time.perf_counter()
+    for _ in range(10):
+        for coins, amount in samples:
+            maker.plan(tuple(coins[coin] for coin in DENOMINATIONS), amount)
+    warm_us = (time.perf_counter() - start) / inventories / 10 * 1e6
+    print(f"per request: greedy {greedy_us:.2f} us, solver with table build {cold_us:.1f} us, "
+          f"cached table {warm_us:.2f} us")
+
+    purchases = []
+    for _ in range(inventories):
+        price = rng.choice(list(Item)).price
+        paid = []
+        while sum(coin.value for coin in paid) < price:
+            paid.append(rng.choice([Coin.QUARTER, Coin.QUARTER, Coin.DIME, Coin.NICKEL]))
+        purchases.append((paid, sum(coin.value for coin in paid) - price))
+
+    inventory = Inventory()
+    failed = 0
+    start = time.perf_counter()
+    for paid, change in purchases:
+        inventory.add_change(paid)
+        try:
+            inventory.deduct_change(change)
+        except NotSufficientChangeException:
+            failed += 1  # The sale is cancelled and the customer gets their own coins back
+            for coin in paid:
+                inventory.coins[coin] -= 1
+    solver_us = (time.perf_counter() - start) / inventories * 1e6
+
+    coins = {coin: 5 for coin in Coin}
+    greedy_failed = 0
+    start = time.perf_counter()
+    for paid, change in purchases:
+        for coin in paid:
+            coins[coin] += 1
+        plan = greedy_change(coins, change)
+        if plan is None:
+            greedy_failed += 1
+            for coin in paid:
+                coins[coin] -= 1
+            continue
+        for coin, count in zip(DENOMINATIONS, plan):
+            coins[coin] -= count
+    greedy_us = (time.perf_counter() - start) / inventories * 1e6
+    print(f"{inventories:,} sales banking the customer's coins: solver {solver_us:.1f} us per sale "
+          f"({inventory.change_maker.builds} table builds, {failed} refunded for lack of change), "
+          f"greedy {greedy_us:.1f} us per sale ({greedy_failed} refunded)")
+
+# Fleet scale: memory per machine for VendingFleet against Inventory and State objects, the
+# median latency of each bulk operation across the fleet (with the same restock and
+# low-stock query looped over the objects for comparison), and a random session of
+# single-machine operations that must behave exactly like VendingMachine
+def benchmark_fleet(machines: int = 50_000, sales: int = 1_000_000, repeats: int = 20, seed: int = 25):
+    import tracemalloc
+
+    rng = np.random.default_rng(seed)
+    tracemalloc.start()
+    fleet = VendingFleet(machines)
+    fleet_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    sample = min(machines, 5_000)
+    tracemalloc.start()
+    objects = [(Inventory(), Idle()) for _ in range(sample)]
+    object_bytes = tracemalloc.get_traced_memory()[0] * machines / sample
+    tracemalloc.stop()
+    print(f"{machines:,} machines: fleet arrays {fleet_bytes / 2**20:.1f} MiB ({fleet_bytes / machines:.0f} bytes/machine), "
+          f"Inventory + State objects {object_bytes / 2**20:.1f} MiB ({object_bytes / machines:.0f} bytes/machine)")
+
+    def timed(operation) -> float:
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            operation()
+            times.append(time.perf_counter() - start)
+        return sorted(times)[len(times) // 2] * 1e3
+
+    def loop_restock():
+        for inventory, _ in objects:
+            for item in Item:
+                inventory.items[item] = max(inventory.items[item], 5)
+
+    def loop_low_stock():
+        return [index for index, (inventory, _) in enumerate(objects) if any(count < 2 for count in inventory.items.values())]
+
+    region = rng.random(machines) < 0.5
+    regional_prices = rng.integers(20, 40, machines, dtype=np.uint16)[region]
+    sale_machines = rng.integers(0, machines, sales)
+    sale_items = rng.integers(0, len(Item), sales)
+    scale = machines / sample
+    rows = [
+        ("restock every item", timed(lambda: fleet.restock(5)), timed(loop_restock) * scale),
+        ("low-stock query", timed(lambda: fleet.low_stock(2)), timed(loop_low_stock) * scale),
+        ("restock low-stock machines", timed(lambda: fleet.restock(5, fleet.low_stock(2))), None),
+        ("fleet-wide price change", timed(lambda: fleet.set_price(Item.COKE, 30)), None),
+        ("regional price change", timed(lambda: fleet.set_price(Item.PEPSI, regional_prices, region)), None),
+        ("low-change query", timed(lambda: fleet.low_change(100)), None),
+    ]
+    fleet.restock(1_000)
+    rows.append((f"record {sales:,} sales", timed(lambda: fleet.record_sales(sale_machines[:sales // repeats],
+                                                                              sale_items[:sales // repeats])) * repeats, None))
+    for name, fleet_ms, loop_ms in rows:
+        comparison = f"   objects {loop_ms:8.2f} ms ({loop_ms / fleet_ms:,.0f}x)" if loop_ms else ""
+        print(f"{name:<28} {fleet_ms:8.3f} ms{comparison}")
+
+    VendingMachine._instance = None
+    machine, fleet, index = VendingMachine(), VendingFleet(16), 7
+    states = {Idle: VendingFleet.IDLE, SelectingItem: VendingFleet.SELECTING_ITEM,
+              ProcessingTransaction: VendingFleet.PROCESSING_TRANSACTION}
+    operations = [
+        (lambda item, coin: machine.select_item(item), lambda item, coin: fleet.select_item(index, item)),
+        (lambda item, coin: machine.insert_coin(coin), lambda item, coin: fleet.insert_coin(index, coin)),
+        (lambda item, coin: machine.collect_item_and_change(), lambda item, coin: fleet.collect_item_and_change(index)),
+        (lambda item, coin: machine.refund(), lambda item, coin: fleet.refund(index)),
+    ]
+
+    def outcome(operation, item, coin):
+        try:
+            return operation(item, coin)
+        except (NotFullPaidException, NotSufficientChangeException, SoldOutException) as error:
+            return type(error)
+
+    py_rng = random.Random(seed)
+    steps = 20_000
+    for _ in range(steps):
+        single, bulk = py_rng.choice(operations)
+        item, coin = py_rng.choice(list(Item)), py_rng.choice(list(Coin))
+        assert outcome(single, item, coin) == outcome(bulk, item, coin)
+        if py_rng.random() < 0.01:
+            machine.inventory.items = {entry: 5 for entry in Item}
+            machine.inventory.coins = {entry: 5 for entry in Coin}
+            fleet.restock(5, [index])
+            fleet.restock_coins(5, [index])
+        assert [machine.inventory.items[entry] for entry in Item] == fleet.items[index].tolist()
+        assert machine.inventory.coin_counts() == tuple(fleet.coins[index].tolist())
+        assert machine.current_balance == fleet.balances[index] and states[type(machine.state)] == fleet.states[index]
+    print(f"single-machine parity: {steps:,} random operations, fleet machine matches VendingMachine")
+
+def _combinations(counts: tuple):
+    if not counts:
+        yield ()
+        return
+    for rest in _combinations(counts[1:]):
+        for n in range(counts[0] + 1):
+            yield (n,) + rest
+
+BENCHMARKS = {
+    "change": benchmark_change,
+    "fleet": benchmark_fleet,
+}
+
+# Benchmarks: python "Vending Machine code.py" benchmark [name ...]
+if __name__ == "__main__" and sys.argv[1:2] == ["benchmark"]:
+    for name in sys.argv[2:] or BENCHMARKS:
+        BENCHMARKS[name]()
+    sys.exit(0)
+
 # Test the Vending Machine
 if __name__ == "__main__":
     vending_machine = VendingMachine()